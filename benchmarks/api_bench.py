@@ -0,0 +1,195 @@
+"""
+End-to-end benchmark of every API route: lists, detail, favorites, stats, create
+and delete. Seeds the database, then runs each scenario through the Flask test
+client (one request at a time) and/or a real gunicorn process at a fixed
+concurrency. Reports p50/p95/p99 latency, throughput and SQL statements per
+request as JSON; pass --compare with a previous report to print the deltas.
+
+Read scenarios mostly hit the entity/response caches after their first request,
+so they are run twice per mode: "client"/"gunicorn" with warm caches and
+"client_cold"/"gunicorn_cold" with the caches emptied before every request
+(test client) or sized to zero (gunicorn).
+
+    python benchmarks/api_bench.py --db sqlite:////tmp/api_bench.db --output before.json
+    python benchmarks/api_bench.py --db postgresql://localhost/bench --characters 50000 \\
+        --compare before.json
+"""
+import argparse
+import json
+import os
+import time
+from common import NO_CACHE_ENV, Server, clear_caches, drive_requests, seed, sql_count, summarize
+
+COMPARED = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps", "sql_mean")
+
+
+def scenarios(volumes):
+    """(name, next_request(index) -> (method, path, body), limit) in execution order."""
+    characters, planets, vehicles, users = (volumes[key] for key in ("characters", "planets", "vehicles", "users"))
+
+    def get(path):
+        return lambda index: ("GET", path, None)
+
+    def cycle(template, count):
+        return lambda index: ("GET", template.format(index % count + 1), None)
+
+    def new_character(index):
+        return ("POST", "/characters", {
+            "name": f"Bench character {index}", "birth_year": "19BBY", "eye_color": "blue",
+            "gender": "male", "hair_color": "blond", "skin_color": "fair", "height": 172, "mass": 77})
+
+    def new_planet(index):
+        return ("POST", "/planets/", {
+            "name": f"Bench planet {index}", "climate": "arid", "terrain": "desert", "gravity": "1 standard",
+            "diameter": "10465", "orbital_period": "304", "rotation_period": "23", "population": "200000",
+            "surface_water": "1"})
+
+    def new_vehicle(index):
+        return ("POST", "/vehicles", {
+            "name": f"Bench vehicle {index}", "model": "T-16", "vehicle_class": "repulsorcraft",
+            "manufacturer": "Incom Corporation", "cost_in_credits": "14500", "length": "10.4",
+            "max_atmosphering_speed": "1200", "crew": "1", "passengers": "0", "cargo_capacity": "50",
+            "consumables": "0"})
+
+    def new_user(index):
+        return ("POST", "/users", {
+            "username": f"bench{index}", "firstname": "Bench", "lastname": f"User {index}",
+            "birthdate": "1990-01-01", "email": f"bench{index}@example.com", "password": "secret"})
+
+    return [
+        ("list_people", get("/people?limit=50"), None),
+        ("list_planets", get("/planets?limit=50"), None),
+        ("list_vehicles", get("/vehicles?limit=50"), None),
+        ("list_users", get("/users?limit=20"), None),
+        ("list_people_filtered", get("/people?gender=female&height__gte=150&limit=50"), None),
+        ("list_people_popular", get("/people?sort=popular&limit=50"), None),
+        ("detail_person", cycle("/people/{}", characters), None),
+        ("detail_planet", cycle("/planets/{}", planets), None),
+        ("detail_vehicle", cycle("/vehicles/{}", vehicles), None),
+        ("user_favorites", cycle("/users/{}/favorites", users), None),
+        ("stats", get("/stats"), None),
+        ("create_character", new_character, None),
+        ("create_planet", new_planet, None),
+        ("create_vehicle", new_vehicle, None),
+        ("create_user", new_user, None),
+        # cada id se agrega y se quita una sola vez: todas las respuestas son escrituras reales
+        ("favorite_add", lambda index: ("POST", f"/favorite/people/{index + 1}", None), characters),
+        ("favorite_delete", lambda index: ("DELETE", f"/favorite/people/{index + 1}", None), characters),
+        # borra los usuarios creados por create_user (ids a partir de users + 1)
+        ("delete_user", lambda index: ("DELETE", f"/users/{users + index + 1}", None), "created_users"),
+    ]
+
+
+def reads(plan):
+    """Only the GET scenarios of a plan."""
+    return [scenario for scenario in plan if scenario[1](0)[0] == "GET"]
+
+
+def run_client(app, plan, repeat, cold=False):
+    client = app.test_client()
+    results = {}
+    created_users = 0
+    for name, next_request, limit in plan:
+        if limit == "created_users":
+            limit = created_users
+        count = repeat if limit is None else min(repeat, limit)
+        latencies, sql_counts, errors = [], [], 0
+        for index in range(count):
+            method, path, body = next_request(index)
+            if cold:
+                clear_caches()
+            start = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            elapsed = time.perf_counter() - start
+            if response.status_code >= 500:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            statements = sql_count(response.headers.get("Server-Timing"))
+            if statements is not None:
+                sql_counts.append(statements)
+        if name == "create_user":
+            created_users = len(latencies)
+        results[name] = summarize(latencies, errors, sum(latencies), sql_counts)
+    return results
+
+
+def run_gunicorn(db_url, plan, args, cold=False):
+    extra_env = dict(NO_CACHE_ENV if cold else {}, SERVER_TIMING="1")
+    server = Server(db_url, args.port, workers=args.workers, extra_env=extra_env)
+    results = {}
+    created_users = 0
+    try:
+        for name, next_request, limit in plan:
+            if limit == "created_users":
+                limit = created_users
+            results[name] = drive_requests(args.port, next_request, args.concurrency, args.duration, limit)
+            if name == "create_user":
+                created_users = results[name]["requests"]
+    finally:
+        server.stop()
+    return results
+
+
+def compare(report, baseline):
+    """Relative change (%) of each compared metric, per mode and scenario."""
+    deltas = {}
+    for mode, results in report["results"].items():
+        for name, summary in results.items():
+            before = baseline.get("results", {}).get(mode, {}).get(name)
+            if not before:
+                continue
+            for metric in COMPARED:
+                old, new = before.get(metric), summary.get(metric)
+                if old and new is not None:
+                    deltas.setdefault(mode, {}).setdefault(name, {})[metric] = round((new - old) / old * 100, 1)
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="sqlite:////tmp/starwars_api_bench.db")
+    parser.add_argument("--characters", type=int, default=1000)
+    parser.add_argument("--planets", type=int, default=200)
+    parser.add_argument("--vehicles", type=int, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--favorites", type=int, default=20, help="favorites per user and entity type")
+    parser.add_argument("--mode", choices=("client", "gunicorn", "both"), default="both")
+    parser.add_argument("--repeat", type=int, default=200, help="requests per scenario with the test client")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario under gunicorn")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=3092)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    args = parser.parse_args()
+
+    # los conteos de SQL salen de la cabecera Server-Timing
+    os.environ["SERVER_TIMING"] = "1"
+    volumes = {key: getattr(args, key) for key in ("characters", "planets", "vehicles", "users", "favorites")}
+    report = {"db": args.db.split("://")[0], "volumes": volumes, "results": {}}
+
+    if args.mode in ("client", "both"):
+        app = seed(args.db, **volumes)
+        report["repeat"] = args.repeat
+        report["results"]["client"] = run_client(app, scenarios(volumes), args.repeat)
+        report["results"]["client_cold"] = run_client(app, reads(scenarios(volumes)), args.repeat, cold=True)
+    if args.mode in ("gunicorn", "both"):
+        seed(args.db, **volumes)
+        report.update(concurrency=args.concurrency, workers=args.workers, duration_s=args.duration)
+        report["results"]["gunicorn"] = run_gunicorn(args.db, scenarios(volumes), args)
+        report["results"]["gunicorn_cold"] = run_gunicorn(args.db, reads(scenarios(volumes)), args, cold=True)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            report["delta_pct"] = compare(report, json.load(baseline))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
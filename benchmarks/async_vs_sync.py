@@ -0,0 +1,52 @@
+"""
+Compare throughput of the sync (gunicorn sync workers) and async (uvicorn workers,
+src/asgi.py) serving modes on the read endpoints at a fixed concurrency.
+
+    python benchmarks/async_vs_sync.py --db sqlite:////tmp/bench.db --concurrency 64
+"""
+import argparse
+import json
+from common import Server, drive_http, seed
+
+READ_PATHS = [
+    "/people?limit=50",
+    "/planets?limit=50",
+    "/vehicles?limit=50",
+    "/people/1",
+    "/planets/2",
+    "/vehicles/3",
+    "/users/1/favorites",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="sqlite:////tmp/starwars_bench.db")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=3091)
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        seed(args.db)
+
+    results = {}
+    for mode in ("sync", "async"):
+        server = Server(args.db, args.port, mode=mode, workers=args.workers)
+        try:
+            results[mode] = drive_http(args.port, READ_PATHS, args.concurrency, args.duration)
+        finally:
+            server.stop()
+
+    print(json.dumps({
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "duration_s": args.duration,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
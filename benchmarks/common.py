@@ -0,0 +1,218 @@
+"""
+Helpers shared by the benchmark scripts: seed a database, start the API under
+gunicorn and drive it at a fixed concurrency.
+"""
+import http.client
+import itertools
+import json
+import os
+import re
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+
+def load_app(db_url):
+    os.environ["DATABASE_URL"] = db_url
+    if SRC not in sys.path:
+        sys.path.insert(0, SRC)
+    from app import app
+    return app
+
+
+# gunicorn environment that keeps every cache at size 0: each read runs its queries
+NO_CACHE_ENV = {"ENTITY_CACHE_SIZE": "0", "RESPONSE_CACHE_SIZE": "0", "COMPRESSED_CACHE_SIZE": "0"}
+
+
+def clear_caches():
+    """Drop cached entities and responses so the next request runs its queries again."""
+    from cache import entity_cache, response_cache, compressed_cache
+    for cache in (entity_cache, response_cache, compressed_cache):
+        cache.clear()
+
+
+def seed(db_url, characters=1000, planets=200, vehicles=200, users=50, favorites=20):
+    """Recreate the schema and fill it with synthetic SWAPI-like rows."""
+    app = load_app(db_url)
+    from sqlalchemy import insert
+    from models import db, Character, Planet, Vehicle, User, Favorite
+    rng = random.Random(42)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(insert(Character), [{
+            "name": f"Character {i}", "birth_year": f"{rng.randint(1, 900)}BBY",
+            "eye_color": rng.choice(["blue", "brown", "yellow", "red"]),
+            "gender": rng.choice(["male", "female", "n/a"]),
+            "hair_color": rng.choice(["blond", "brown", "none"]),
+            "skin_color": rng.choice(["fair", "gold", "white"]),
+            "height": rng.randint(60, 250), "mass": rng.randint(20, 180),
+        } for i in range(characters)])
+        db.session.execute(insert(Planet), [{
+            "name": f"Planet {i}", "climate": rng.choice(["arid", "temperate", "frozen", "murky"]),
+            "terrain": rng.choice(["desert", "grasslands", "tundra"]), "gravity": "1 standard",
+            "diameter": str(rng.randint(1000, 20000)), "orbital_period": str(rng.randint(100, 500)),
+            "rotation_period": str(rng.randint(10, 40)),
+            "population": rng.choice(["unknown", str(rng.randint(1000, 10 ** 9))]),
+            "surface_water": str(rng.randint(0, 100)),
+        } for i in range(planets)])
+        db.session.execute(insert(Vehicle), [{
+            "name": f"Vehicle {i}", "model": f"Model {i % 17}",
+            "vehicle_class": rng.choice(["wheeled", "repulsorcraft", "starfighter"]),
+            "manufacturer": rng.choice(["Corellia Mining Corporation", "Incom Corporation", "Sienar Fleet Systems"]),
+            "cost_in_credits": rng.choice(["unknown", str(rng.randint(1000, 200000))]),
+            "length": str(rng.randint(2, 40)), "crew": str(rng.randint(1, 10)),
+            "passengers": str(rng.randint(0, 30)), "max_atmosphering_speed": str(rng.randint(100, 1200)),
+            "cargo_capacity": rng.choice(["none", str(rng.randint(10, 50000))]), "consumables": "2 months",
+        } for i in range(vehicles)])
+        db.session.execute(insert(User), [{
+            "username": f"user{i}", "firstname": "Test", "lastname": f"User {i}",
+            "birthdate": date(1990, 1, 1), "email": f"user{i}@example.com",
+            "password": "secret", "is_active": True,
+        } for i in range(users)])
+        rows = []
+        for entity_type, count in (("character", characters), ("planet", planets), ("vehicle", vehicles)):
+            for user_id in range(1, users + 1):
+                for entity_id in rng.sample(range(1, count + 1), min(favorites, count)):
+                    rows.append({"user_id": user_id, "entity_type": entity_type, "entity_id": entity_id})
+        if rows:
+            db.session.execute(insert(Favorite), rows)
+        db.session.commit()
+        # el insert directo no pasa por favorites.py: los contadores se calculan aparte
+        from commands import reconcile_counts
+        for entity_type in ("character", "planet", "vehicle"):
+            reconcile_counts(entity_type, 1000)
+    return app
+
+
+class Server:
+    """Runs gunicorn from the repo root so gunicorn.conf.py is picked up."""
+
+    def __init__(self, db_url, port, mode="sync", workers=2, extra_env=None, extra_args=()):
+        env = dict(os.environ, DATABASE_URL=db_url, SERVER_MODE=mode, **(extra_env or {}))
+        args = [sys.executable, "-m", "gunicorn", "--chdir", "./src/", "-b", f"127.0.0.1:{port}",
+                "-w", str(workers), "--log-level", "warning", *extra_args]
+        self.port = port
+        self.process = subprocess.Popen(args, cwd=ROOT, env=env)
+        self.wait_ready()
+
+    def wait_ready(self, timeout=20):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=1)
+                connection.request("GET", "/people?limit=1")
+                connection.getresponse().read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"gunicorn did not start on port {self.port}")
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait(timeout=20)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+SQL_COUNT = re.compile(r'desc="(\d+) queries"')
+
+
+def sql_count(server_timing):
+    """Statement count reported by the Server-Timing header (SERVER_TIMING=1)."""
+    match = SQL_COUNT.search(server_timing or "")
+    return int(match.group(1)) if match else None
+
+
+def summarize(latencies, errors, elapsed, sql_counts=None):
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else None,
+    }
+    if sql_counts:
+        summary["sql_mean"] = round(statistics.fmean(sql_counts), 2)
+        summary["sql_max"] = max(sql_counts)
+    return summary
+
+
+def drive_http(port, paths, concurrency=16, duration=10.0, method="GET"):
+    """Keep `concurrency` keep-alive connections busy for `duration` seconds."""
+    return drive_requests(port, lambda index: (method, paths[index % len(paths)], None),
+                          concurrency, duration)
+
+
+def drive_requests(port, next_request, concurrency=16, duration=10.0, limit=None):
+    """
+    Like drive_http, but next_request(index) returns (method, path, json_body) so
+    writes can use fresh ids. Stops after `limit` requests if given.
+    """
+    latencies = []
+    sql_counts = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = itertools.count()
+    stop_at = time.perf_counter() + duration
+
+    def worker():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        local = []
+        local_sql = []
+        while time.perf_counter() < stop_at:
+            index = next(counter)
+            if limit is not None and index >= limit:
+                break
+            method, path, body = next_request(index)
+            headers = {}
+            if body is not None:
+                body = json.dumps(body)
+                headers["Content-Type"] = "application/json"
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                ok = False
+            if ok:
+                local.append(time.perf_counter() - start)
+                statements = sql_count(response.getheader("Server-Timing"))
+                if statements is not None:
+                    local_sql.append(statements)
+            else:
+                with lock:
+                    errors[0] += 1
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            sql_counts.extend(local_sql)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started, sql_counts)
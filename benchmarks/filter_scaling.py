@@ -0,0 +1,48 @@
+"""
+Latency of filtered list requests as the catalog grows. Each size is seeded from
+scratch and every query is timed in-process through the Flask test client, with
+the caches cleared before each request so the filter query itself runs.
+
+    python benchmarks/filter_scaling.py --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import time
+from common import seed, summarize, clear_caches
+
+QUERIES = [
+    "/people?gender=female&limit=50",
+    "/people?height__gte=200&limit=50",
+    "/people?name__prefix=Character%2012&limit=50",
+    "/planets?climate__contains=arid&limit=50",
+    "/vehicles?vehicle_class=wheeled&limit=50",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="sqlite:////tmp/starwars_filters.db")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    report = []
+    for size in args.sizes:
+        app = seed(args.db, characters=size, planets=size, vehicles=size, users=1, favorites=0)
+        client = app.test_client()
+        row = {"rows": size, "queries": {}}
+        for query in QUERIES:
+            client.get(query)
+            latencies = []
+            for _ in range(args.repeat):
+                clear_caches()
+                start = time.perf_counter()
+                client.get(query)
+                latencies.append(time.perf_counter() - start)
+            row["queries"][query] = summarize(latencies, 0, sum(latencies))
+        report.append(row)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Per-row serialization cost of the old hand-written serialize() + stdlib json path
+versus the compiled serializers (column-only select, Row tuples, orjson).
+
+    python benchmarks/serializer_bench.py --rows 20000
+"""
+import argparse
+import json
+import time
+from common import seed
+
+
+def legacy_character(obj):
+    # copia del Character.serialize() anterior, construido atributo por atributo
+    return {
+        "id": obj.id,
+        "name": obj.name,
+        "birth year": obj.birth_year,
+        "eye color": obj.eye_color,
+        "gender": obj.gender,
+        "hair color": obj.hair_color,
+        "skincolor": obj.skin_color,
+        "height": obj.height,
+        "mass": obj.mass,
+    }
+
+
+def timed(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default="sqlite:////tmp/starwars_serializers.db")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = seed(args.db, characters=args.rows, planets=1, vehicles=1, users=1, favorites=0)
+    from models import db, Character
+    from serializers import serializer_for, dumps, orjson
+
+    serializer = serializer_for(Character)
+    with app.app_context():
+        def before():
+            objects = db.session.scalars(db.select(Character)).all()
+            json.dumps([legacy_character(obj) for obj in objects], sort_keys=True)
+            db.session.expunge_all()
+
+        def after():
+            rows = db.session.execute(serializer.select()).all()
+            dumps([serializer.from_row(row) for row in rows])
+
+        objects = db.session.scalars(db.select(Character)).all()
+        rows = db.session.execute(serializer.select()).all()
+        encode_before = timed(lambda: json.dumps([legacy_character(obj) for obj in objects], sort_keys=True), args.repeat)
+        encode_after = timed(lambda: dumps([serializer.from_row(row) for row in rows]), args.repeat)
+        db.session.expunge_all()
+        total_before = timed(before, args.repeat)
+        total_after = timed(after, args.repeat)
+
+    per_row = lambda seconds: round(seconds / args.rows * 1e6, 3)
+    print(json.dumps({
+        "rows": args.rows,
+        "json_backend": "orjson" if orjson is not None else "json",
+        "serialize_and_encode_us_per_row": {"before": per_row(encode_before), "after": per_row(encode_after)},
+        "fetch_serialize_encode_us_per_row": {"before": per_row(total_before), "after": per_row(total_after)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Cold-start cost of importing the app (what every gunicorn worker pays without
+--preload) in each startup mode: import time, peak RSS and the slowest imported
+modules according to `python -X importtime`. Each measurement runs in a fresh
+interpreter. With --max-import-ms / --max-rss-mb the script exits with status 1
+when a mode exceeds the budget, so it can guard against startup regressions.
+
+    python benchmarks/startup.py --repeat 5 --max-import-ms 800
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from common import ROOT, SRC
+
+MODES = {
+    "full": {},
+    "lazy_admin": {"ADMIN_LAZY": "1"},
+    "api_only": {"API_ONLY": "1"},
+}
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"import_ms": elapsed * 1000, "rss_mb": rss_kb / 1024,
+                  "modules": len(sys.modules), "flask_admin": "flask_admin" in sys.modules}))
+"""
+
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def run(env, *args):
+    return subprocess.run([sys.executable, *args], cwd=SRC, env=env, capture_output=True, text=True, check=True)
+
+
+def slowest_imports(env, top):
+    # módulos importados directamente por app, por tiempo acumulado
+    output = run(env, "-X", "importtime", "-c", "import app").stderr
+    modules = []
+    for line in output.splitlines():
+        match = IMPORTTIME.match(line)
+        if match and len(match.group(3)) == 3:
+            modules.append((int(match.group(2)), match.group(4)))
+    return [{"module": name, "cumulative_ms": round(us / 1000, 2)} for us, name in sorted(modules, reverse=True)[:top]]
+
+
+def measure(db_url, overrides, repeat, top):
+    env = {key: value for key, value in os.environ.items() if key not in ("API_ONLY", "ADMIN_LAZY")}
+    env.update(DATABASE_URL=db_url, **overrides)
+    samples = [json.loads(run(env, "-c", PROBE).stdout.strip().splitlines()[-1]) for _ in range(repeat)]
+    return {
+        "import_ms_median": round(statistics.median(s["import_ms"] for s in samples), 2),
+        "import_ms_max": round(max(s["import_ms"] for s in samples), 2),
+        "rss_mb_median": round(statistics.median(s["rss_mb"] for s in samples), 2),
+        "modules": samples[-1]["modules"],
+        "flask_admin_loaded": samples[-1]["flask_admin"],
+        "slowest_imports": slowest_imports(env, top),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="sqlite:////tmp/starwars_startup.db")
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=list(MODES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument("--max-import-ms", type=float, help="fail if a mode's median import time exceeds this")
+    parser.add_argument("--max-rss-mb", type=float, help="fail if a mode's median RSS exceeds this")
+    args = parser.parse_args()
+
+    report = {"python": sys.version.split()[0], "root": ROOT, "modes": {}}
+    failures = []
+    for mode in args.modes:
+        result = report["modes"][mode] = measure(args.db, MODES[mode], args.repeat, args.top)
+        if args.max_import_ms is not None and result["import_ms_median"] > args.max_import_ms:
+            failures.append(f"{mode}: import {result['import_ms_median']} ms > {args.max_import_ms} ms")
+        if args.max_rss_mb is not None and result["rss_mb_median"] > args.max_rss_mb:
+            failures.append(f"{mode}: RSS {result['rss_mb_median']} MB > {args.max_rss_mb} MB")
+    report["failures"] = failures
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# gunicorn lee este archivo automáticamente al arrancar desde la raíz del proyecto.
+# SERVER_MODE=async sirve los endpoints de lectura con el motor asyncio (src/asgi.py).
+# GUNICORN_PRELOAD=1 importa la app una sola vez en el proceso maestro; los workers
+# la comparten copy-on-write (conviene junto con API_ONLY=1).
+import os
+
+if os.getenv("SERVER_MODE", "sync") == "async":
+    wsgi_app = "asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "wsgi"
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") in ("1", "true")
+
+
+def post_fork(server, worker):
+    # las conexiones abiertas por el maestro no se pueden compartir entre procesos
+    if preload_app:
+        from app import app
+        from models import db
+        with app.app_context():
+            db.engine.dispose(close=False)
@@ -0,0 +1,46 @@
+"""indexes for catalog filters
+
+Revision ID: 672f0bce9a00
+Revises: 8a04f129424a
+Create Date: 2026-10-18 11:02:17.904613
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '672f0bce9a00'
+down_revision = '8a04f129424a'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_INDEXES = [
+    ('character', 'name'),
+    ('planet', 'name'),
+    ('planet', 'climate'),
+    ('planet', 'terrain'),
+    ('vehicle', 'name'),
+    ('vehicle', 'manufacturer'),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    for table, column in TRIGRAM_INDEXES:
+        op.create_index(f'ix_{table}_{column}_trgm', table, [column], unique=False,
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+    op.create_index('ix_character_gender', 'character', ['gender'], unique=False)
+    op.create_index('ix_character_height', 'character', ['height'], unique=False)
+    op.create_index('ix_character_mass', 'character', ['mass'], unique=False)
+    op.create_index('ix_vehicle_vehicle_class', 'vehicle', ['vehicle_class'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_vehicle_vehicle_class', table_name='vehicle')
+    op.drop_index('ix_character_mass', table_name='character')
+    op.drop_index('ix_character_height', table_name='character')
+    op.drop_index('ix_character_gender', table_name='character')
+    for table, column in reversed(TRIGRAM_INDEXES):
+        op.drop_index(f'ix_{table}_{column}_trgm', table_name=table)
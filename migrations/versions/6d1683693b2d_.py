@@ -0,0 +1,81 @@
+"""single polymorphic favorite table replacing the per-entity favorite tables
+
+Revision ID: 6d1683693b2d
+Revises: 76dea9c2dc0a
+Create Date: 2026-10-18 13:05:21.734410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d1683693b2d'
+down_revision = '76dea9c2dc0a'
+branch_labels = None
+depends_on = None
+
+# entity_type -> (tabla antigua, columna de la entidad, tabla de la entidad)
+OLD_TABLES = {
+    'character': ('favoritecharacter', 'character_id', 'character'),
+    'planet': ('favoriteplanet', 'planet_id', 'planet'),
+    'vehicle': ('favoritevehicle', 'vehicle_id', 'vehicle'),
+}
+
+
+def old_table(table_name, column):
+    return sa.table(table_name, sa.column('id'), sa.column('user_id'), sa.column(column))
+
+
+def upgrade():
+    op.create_table('favorite',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # copia de datos con INSERT ... SELECT, sin pasar las filas por Python
+    favorite = sa.table('favorite', sa.column('user_id'), sa.column('entity_type'), sa.column('entity_id'))
+    for entity_type, (table_name, column, _) in OLD_TABLES.items():
+        old = old_table(table_name, column)
+        op.execute(favorite.insert().from_select(
+            ['user_id', 'entity_type', 'entity_id'],
+            sa.select(old.c.user_id, sa.literal(entity_type), old.c[column]).order_by(old.c.id)))
+
+    op.create_index('ix_favorite_user_entity', 'favorite', ['user_id', 'entity_type', 'entity_id'], unique=True)
+    op.create_index('ix_favorite_entity', 'favorite', ['entity_type', 'entity_id'], unique=False)
+
+    for table_name, column, _ in OLD_TABLES.values():
+        entity = column[:-len('_id')]
+        op.drop_index(f'ix_{table_name}_{column}', table_name=table_name)
+        op.drop_index(f'ix_{table_name}_user_{entity}', table_name=table_name)
+        op.drop_table(table_name)
+
+
+def downgrade():
+    favorite = sa.table('favorite', sa.column('id'), sa.column('user_id'),
+                        sa.column('entity_type'), sa.column('entity_id'))
+    for entity_type, (table_name, column, entity_table) in OLD_TABLES.items():
+        entity = column[:-len('_id')]
+        op.create_table(table_name,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column(column, sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint([column], [f'{entity_table}.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.execute(old_table(table_name, column).insert().from_select(
+            ['user_id', column],
+            sa.select(favorite.c.user_id, favorite.c.entity_id)
+            .where(favorite.c.entity_type == entity_type)
+            .order_by(favorite.c.id)))
+        op.create_index(f'ix_{table_name}_user_{entity}', table_name, ['user_id', column], unique=True)
+        op.create_index(f'ix_{table_name}_{column}', table_name, [column], unique=False)
+
+    op.drop_index('ix_favorite_entity', table_name='favorite')
+    op.drop_index('ix_favorite_user_entity', table_name='favorite')
+    op.drop_table('favorite')
@@ -0,0 +1,78 @@
+"""numeric columns for SWAPI metrics on planet and vehicle
+
+Revision ID: 76dea9c2dc0a
+Revises: 672f0bce9a00
+Create Date: 2026-10-18 11:40:53.226107
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '76dea9c2dc0a'
+down_revision = '672f0bce9a00'
+branch_labels = None
+depends_on = None
+
+NUMERIC_COLUMNS = {
+    'planet': ['diameter', 'orbital_period', 'rotation_period', 'population', 'surface_water'],
+    'vehicle': ['cost_in_credits', 'length', 'crew', 'passengers', 'cargo_capacity'],
+}
+BATCH_SIZE = 1000
+UNKNOWN_VALUES = ('', 'unknown', 'n/a', 'none', 'indefinite')
+
+
+def to_number(value):
+    # misma conversión que models.to_number, copiada para que la migración no dependa del modelo
+    if value is None:
+        return None
+    value = str(value).strip().lower().replace(',', '')
+    if value in UNKNOWN_VALUES:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def backfill(connection, table_name, columns):
+    # por rangos de id y con commit en cada lote, para no bloquear la tabla entera
+    table = sa.table(table_name, sa.column('id'), *[sa.column(name) for name in columns],
+                     *[sa.column(name + '_value') for name in columns])
+    last_id = connection.execute(sa.select(sa.func.max(table.c.id))).scalar() or 0
+    update = (sa.update(table).where(table.c.id == sa.bindparam('row_id'))
+              .values({name + '_value': sa.bindparam(name + '_value') for name in columns}))
+    for start in range(0, last_id, BATCH_SIZE):
+        rows = connection.execute(
+            sa.select(table.c.id, *[table.c[name] for name in columns])
+            .where(table.c.id > start, table.c.id <= start + BATCH_SIZE)).all()
+        if rows:
+            connection.execute(update, [
+                {'row_id': row[0], **{name + '_value': to_number(value) for name, value in zip(columns, row[1:])}}
+                for row in rows])
+
+
+def upgrade():
+    for table_name, columns in NUMERIC_COLUMNS.items():
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for name in columns:
+                batch_op.add_column(sa.Column(name + '_value', sa.Float(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        for table_name, columns in NUMERIC_COLUMNS.items():
+            backfill(connection, table_name, columns)
+        for table_name, columns in NUMERIC_COLUMNS.items():
+            for name in columns:
+                op.create_index(f'ix_{table_name}_{name}_value', table_name, [name + '_value'],
+                                unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    for table_name, columns in NUMERIC_COLUMNS.items():
+        for name in columns:
+            op.drop_index(f'ix_{table_name}_{name}_value', table_name=table_name)
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            for name in reversed(columns):
+                batch_op.drop_column(name + '_value')
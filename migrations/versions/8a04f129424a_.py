@@ -0,0 +1,143 @@
+"""catalog and favorites tables with favorite lookup indexes
+
+Revision ID: 8a04f129424a
+Revises: a5cffa318ac2
+Create Date: 2026-10-18 10:12:44.318220
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a04f129424a'
+down_revision = 'a5cffa318ac2'
+branch_labels = None
+depends_on = None
+
+
+USER_COLUMNS = {
+    'username': sa.String(length=120),
+    'firstname': sa.String(length=30),
+    'lastname': sa.String(length=30),
+    'birthdate': sa.Date(),
+}
+
+
+def upgrade():
+    # las columnas nuevas de user se agregan nulas, se completan en los usuarios existentes
+    # y recién después pasan a NOT NULL (si no, la migración falla con la tabla con datos)
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        for name, type_ in USER_COLUMNS.items():
+            batch_op.add_column(sa.Column(name, type_, nullable=True))
+
+    user = sa.table('user', sa.column('email'), *[sa.column(name) for name in USER_COLUMNS])
+    # el email ya es único: sirve de username hasta que cada usuario elija el suyo
+    op.execute(user.update().where(user.c.username.is_(None))
+               .values(username=user.c.email, firstname='', lastname='', birthdate=date(1970, 1, 1)))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        for name, type_ in USER_COLUMNS.items():
+            batch_op.alter_column(name, existing_type=type_, nullable=False)
+        batch_op.create_unique_constraint('uq_user_username', ['username'])
+
+    op.create_table('character',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('birth_year', sa.String(length=20), nullable=False),
+    sa.Column('eye_color', sa.String(length=20), nullable=False),
+    sa.Column('gender', sa.String(length=20), nullable=False),
+    sa.Column('hair_color', sa.String(length=20), nullable=False),
+    sa.Column('skin_color', sa.String(length=20), nullable=False),
+    sa.Column('height', sa.Integer(), nullable=False),
+    sa.Column('mass', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('planet',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('climate', sa.String(length=50), nullable=False),
+    sa.Column('terrain', sa.String(length=50), nullable=False),
+    sa.Column('gravity', sa.String(length=20), nullable=False),
+    sa.Column('diameter', sa.String(length=20), nullable=False),
+    sa.Column('orbital_period', sa.String(length=20), nullable=False),
+    sa.Column('rotation_period', sa.String(length=20), nullable=False),
+    sa.Column('population', sa.String(length=30), nullable=False),
+    sa.Column('surface_water', sa.String(length=20), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('vehicle',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('model', sa.String(length=100), nullable=False),
+    sa.Column('vehicle_class', sa.String(length=50), nullable=False),
+    sa.Column('manufacturer', sa.String(length=100), nullable=False),
+    sa.Column('cost_in_credits', sa.String(length=20), nullable=False),
+    sa.Column('length', sa.String(length=20), nullable=False),
+    sa.Column('crew', sa.String(length=20), nullable=False),
+    sa.Column('passengers', sa.String(length=20), nullable=False),
+    sa.Column('max_atmosphering_speed', sa.String(length=20), nullable=False),
+    sa.Column('cargo_capacity', sa.String(length=20), nullable=False),
+    sa.Column('consumables', sa.String(length=50), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('table_version',
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.create_table('favoritecharacter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('character_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['character_id'], ['character.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_favoritecharacter_user_character', 'favoritecharacter', ['user_id', 'character_id'], unique=True)
+    op.create_index('ix_favoritecharacter_character_id', 'favoritecharacter', ['character_id'], unique=False)
+    op.create_table('favoriteplanet',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('planet_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['planet_id'], ['planet.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_favoriteplanet_user_planet', 'favoriteplanet', ['user_id', 'planet_id'], unique=True)
+    op.create_index('ix_favoriteplanet_planet_id', 'favoriteplanet', ['planet_id'], unique=False)
+    op.create_table('favoritevehicle',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('vehicle_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['vehicle_id'], ['vehicle.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_favoritevehicle_user_vehicle', 'favoritevehicle', ['user_id', 'vehicle_id'], unique=True)
+    op.create_index('ix_favoritevehicle_vehicle_id', 'favoritevehicle', ['vehicle_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_favoritevehicle_vehicle_id', table_name='favoritevehicle')
+    op.drop_index('ix_favoritevehicle_user_vehicle', table_name='favoritevehicle')
+    op.drop_table('favoritevehicle')
+    op.drop_index('ix_favoriteplanet_planet_id', table_name='favoriteplanet')
+    op.drop_index('ix_favoriteplanet_user_planet', table_name='favoriteplanet')
+    op.drop_table('favoriteplanet')
+    op.drop_index('ix_favoritecharacter_character_id', table_name='favoritecharacter')
+    op.drop_index('ix_favoritecharacter_user_character', table_name='favoritecharacter')
+    op.drop_table('favoritecharacter')
+    op.drop_table('table_version')
+    op.drop_table('vehicle')
+    op.drop_table('planet')
+    op.drop_table('character')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_username', type_='unique')
+        batch_op.drop_column('birthdate')
+        batch_op.drop_column('lastname')
+        batch_op.drop_column('firstname')
+        batch_op.drop_column('username')
@@ -0,0 +1,30 @@
+"""btree index on name for exact lookups (import-swapi upserts by name)
+
+Revision ID: b3e91f0c4d27
+Revises: 6d1683693b2d
+Create Date: 2026-10-18 18:12:40.511903
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e91f0c4d27'
+down_revision = '6d1683693b2d'
+branch_labels = None
+depends_on = None
+
+TABLES = ('character', 'planet', 'vehicle')
+
+
+def upgrade():
+    # CONCURRENTLY fuera de la transacción de la migración, para no bloquear escrituras
+    with op.get_context().autocommit_block():
+        for table_name in TABLES:
+            op.create_index(f'ix_{table_name}_name', table_name, ['name'],
+                            unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    for table_name in TABLES:
+        op.drop_index(f'ix_{table_name}_name', table_name=table_name)
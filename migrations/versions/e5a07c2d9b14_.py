@@ -0,0 +1,54 @@
+"""favorite_count on character, planet and vehicle, indexed for popularity ordering
+
+Revision ID: e5a07c2d9b14
+Revises: b3e91f0c4d27
+Create Date: 2026-10-18 19:05:27.183406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a07c2d9b14'
+down_revision = 'b3e91f0c4d27'
+branch_labels = None
+depends_on = None
+
+TABLES = ('character', 'planet', 'vehicle')
+BATCH_SIZE = 1000
+
+
+def backfill(connection, table_name):
+    # un UPDATE con COUNT(*) correlacionado por cada BATCH_SIZE ids (autocommit_block: cada uno se confirma solo)
+    table = sa.table(table_name, sa.column('id'), sa.column('favorite_count'))
+    favorite = sa.table('favorite', sa.column('entity_type'), sa.column('entity_id'))
+    count = (sa.select(sa.func.count()).select_from(favorite)
+             .where(favorite.c.entity_type == table_name, favorite.c.entity_id == table.c.id)
+             .scalar_subquery())
+    last_id = connection.execute(sa.select(sa.func.max(table.c.id))).scalar() or 0
+    for start in range(0, last_id, BATCH_SIZE):
+        connection.execute(sa.update(table)
+                           .where(table.c.id > start, table.c.id <= start + BATCH_SIZE)
+                           .values(favorite_count=count))
+
+
+def upgrade():
+    for table_name in TABLES:
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('favorite_count', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        for table_name in TABLES:
+            backfill(connection, table_name)
+        for table_name in TABLES:
+            op.create_index(f'ix_{table_name}_popular', table_name, ['favorite_count', 'id'],
+                            unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    for table_name in TABLES:
+        op.drop_index(f'ix_{table_name}_popular', table_name=table_name)
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.drop_column('favorite_count')
@@ -1,36 +1,43 @@
 import os
 from flask_admin import Admin
-from models import db, User, Character, Planet, Vehicle, FavoriteCharacter, FavoritePlanet, FavoriteVehicle
+from models import db, User, Character, Planet, Vehicle, Favorite, FAVORITE_TYPES
 from flask_admin.contrib.sqla import ModelView
+from cache import invalidate
 
 
-class UserModelView(ModelView):
-    column_auto_select_related = True
-    column_list = ('id', 'username', 'firstname', 'lastname', 'birthdate', 'email','password', 'is_active', 'favoritec', 'favoritep', 'favoritev')
+class CachedModelView(ModelView):
+    # cualquier cambio desde el admin borra el registro de la caché de entidades
+    def after_model_change(self, form, model, is_created):
+        invalidate(model.__tablename__, model.id)
 
-class CharacterModelView(ModelView):
-    column_auto_select_related = True
-    column_list = ('id', 'name', 'birth_year', 'eye_color', 'gender', 'hair_color', 'skin_color', 'height', 'mass', 'favorites_by')
+    def after_model_delete(self, model):
+        invalidate(model.__tablename__, model.id)
 
-class PlanetModelView(ModelView):
+
+class UserModelView(ModelView):
     column_auto_select_related = True
-    column_list = ('id', 'name', 'climate', 'terrain', 'gravity', 'diameter', 'orbital_period', 'rotation_period', 'population', 'surface_water', 'favorites_by')   
+    column_list = ('id', 'username', 'firstname', 'lastname', 'birthdate', 'email','password', 'is_active', 'favorites')
 
-class VehicleModelView(ModelView):
+class CharacterModelView(CachedModelView):
     column_auto_select_related = True
-    column_list = ('id', 'name', 'model', 'vehicle_class', 'manufacturer', 'cost_in_credits', 'max_atmosphering_speed', 'cargo_capacity', 'consumables', 'favorites_by')    
+    column_list = ('id', 'name', 'birth_year', 'eye_color', 'gender', 'hair_color', 'skin_color', 'height', 'mass')
+    form_excluded_columns = ('favorite_count',)
 
-class FavoriteCharacterModelView(ModelView):
+class PlanetModelView(CachedModelView):
     column_auto_select_related = True
-    column_list = ('id',  'user', 'character')  
+    column_list = ('id', 'name', 'climate', 'terrain', 'gravity', 'diameter', 'orbital_period', 'rotation_period', 'population', 'surface_water')   
+    form_excluded_columns = tuple(Planet.numeric_fields.values()) + ('favorite_count',)
 
-class FavoritePlanetModelView(ModelView):
+class VehicleModelView(CachedModelView):
     column_auto_select_related = True
-    column_list = ('id',  'user', 'planet')    
+    column_list = ('id', 'name', 'model', 'vehicle_class', 'manufacturer', 'cost_in_credits', 'max_atmosphering_speed', 'cargo_capacity', 'consumables')    
+    form_excluded_columns = tuple(Vehicle.numeric_fields.values()) + ('favorite_count',)
 
-class FavoriteVehicleModelView(ModelView):
+class FavoriteModelView(ModelView):
     column_auto_select_related = True
-    column_list = ('id',  'user', 'vehicle')    
+    column_list = ('id',  'user', 'entity_type', 'entity_id')
+    column_filters = ('entity_type',)
+    form_choices = {'entity_type': [(entity_type, entity_type) for entity_type in FAVORITE_TYPES]}
 
 
 def setup_admin(app):
@@ -44,9 +51,7 @@ def setup_admin(app):
     admin.add_view(CharacterModelView(Character, db.session))
     admin.add_view(PlanetModelView(Planet, db.session))
     admin.add_view(VehicleModelView(Vehicle, db.session))
-    admin.add_view(FavoriteCharacterModelView(FavoriteCharacter, db.session))
-    admin.add_view(FavoritePlanetModelView(FavoritePlanet, db.session))
-    admin.add_view(FavoriteVehicleModelView(FavoriteVehicle, db.session))  
+    admin.add_view(FavoriteModelView(Favorite, db.session))
 
     # You can duplicate that line to add mew models
     # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
@@ -2,66 +2,143 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+from datetime import date
+from threading import Lock
+from flask import Flask, Blueprint, Response, current_app, request, jsonify, g
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
-from admin import setup_admin
-from models import Character, FavoriteCharacter, FavoritePlanet, FavoriteVehicle, Planet, Vehicle, db, User
+from utils import (APIException, build_sitemap, sitemap_response, conditional, keyset_page, wants_page, wants_stream,
+                   stream_rows, list_statement, serialize_result, json_response, validate_item, missing_field_error,
+                   parse_bulk_body, bulk_insert, parse_ids, parse_fields, fetch_by_ids,
+                   MAX_BATCH_IDS, MIN_INTEGER, MAX_INTEGER)
+from cache import entity_cache, get_entity_json, invalidate, init_cache
+from pool import engine_options, pool_status
+from replicas import replica_binds, init_replicas, bind_engines
+from metrics import init_metrics, request_metrics, gauge_lines, labeled_gauge_lines
+from compression import init_compression
+from favorites import FAVORITE_KINDS, add_favorite, remove_favorite, apply_batch, user_exists
+from stats import STATS_TABLES, DEFAULT_TOP, MAX_TOP, get_stats_json
+from models import Character, Planet, Vehicle, db, User, attach_favorites, favorites_statement, group_favorites
 # from models import Person
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
-
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace(
-        "postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
+# las rutas se registran en el blueprint; create_app (al final del archivo) arma la aplicación
+api = Blueprint('api', __name__)
+
+# campos obligatorios al crear cada entidad, con su mensaje de error
+USER_FIELDS = {
+    "username": "Debe enviar el nombre de usuario",
+    "firstname": "Debe enviar el nombre",
+    "lastname": "Debe enviar el apellido",
+    "email": "Debe enviar el correo electrónico",
+    "password": "Debe enviar la contraseña",
+}
+CHARACTER_FIELDS = {
+    "name": "Es obligatorio el nombre del personaje",
+    "height": "Es obligatorio  la altura del personaje",
+    "mass": "Es obligatorio la masa del personaje",
+    "hair_color": "Es obligatorio el color de cabello del personaje",
+    "skin_color": "Es obligatorio el color de piel del personaje",
+    "eye_color": "Es obligatorio el color de ojos del personaje",
+    "birth_year": "Es obligatorio el año de nacimiento del personaje",
+    "gender": "Es obligatorio el género del personaje",
+}
+
+PLANET_FIELDS = {
+    "name": "Es obligatorio el nombre del planeta",
+    "rotation_period": "Es obligatorio el periodo de rotación del planeta",
+    "orbital_period": "Es obligatorio el periodo orbital del planeta",
+    "diameter": "Es obligatorio el diámetro del planeta",
+    "climate": "Es obligatorio el clima del planeta",
+    "gravity": "Es obligatorio la gravedad del planeta",
+    "terrain": "Es obligatorio el terreno del planeta",
+    "surface_water": "Es obligatorio el agua superficial del planeta",
+    "population": "Es obligatoria la población del planeta",
+}
+
+VEHICLE_FIELDS = {
+    "name": "Es obligatorio el nombre del vehículo",
+    "model": "Es obligatorio el modelo del vehículo",
+    "manufacturer": "Es obligatorio el fabricante del vehículo",
+    "vehicle_class": "Es obligatoria la clase del vehículo",
+    "cost_in_credits": "Es obligatorio el costo en créditos del vehículo",
+    "length": "Es obligatoria la longitud del vehículo",
+    "max_atmosphering_speed": "Es obligatoria la velocidad máxima en atmósfera del vehículo",
+    "crew": "Es obligatoria la tripulación del vehículo",
+    "passengers": "Es obligatoria la cantidad de pasajeros del vehículo",
+    "cargo_capacity": "Es obligatoria la capacidad de carga del vehículo",
+    "consumables": "Es obligatorio los consumibles del vehículo",
+}
+
+FAVORITE_TABLES = ('favorite', 'character', 'planet', 'vehicle')
 
 # Handle/serialize errors like a JSON object
 
 
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
 
 
 
-@app.route('/')
+@api.route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return sitemap_response(current_app.extensions['sitemap'], request)
+
+
+@api.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(entity_cache.stats()), 200
+
+
+@api.route('/stats', methods=['GET'])
+@conditional(*STATS_TABLES)
+def get_stats():
+    try:
+        top = int(request.args.get('top', DEFAULT_TOP))
+    except ValueError:
+        return jsonify({"msg": "El parámetro top debe ser un número"}), 400
+    top = max(1, min(top, MAX_TOP))
+    return Response(get_stats_json(top), mimetype='application/json'), 200
+
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    lines = request_metrics.render()
+    pools = [({'bind': bind}, pool_status(engine, bind)) for bind, engine in bind_engines(db)]
+    lines += labeled_gauge_lines('db_pool', pools, 'SQLAlchemy connection pool.')
+    lines += gauge_lines('entity_cache', entity_cache.stats(), 'Serialized entity cache.')
+    return Response("\n".join(lines) + "\n", mimetype='text/plain; version=0.0.4'), 200
+
+
+@api.route('/metrics/pool', methods=['GET'])
+def get_pool_metrics():
+    # un pool por bind: el primario y cada réplica
+    status = {'pools': [pool_status(engine, bind) for bind, engine in bind_engines(db)]}
+    replicas = current_app.extensions['replicas']
+    if replicas is not None:
+        status['read_replicas'] = replicas.status()
+    return jsonify(status), 200
 
 # USER
 
 
-@app.route('/users', methods=['POST'])
+@api.route('/users', methods=['POST'])
 def create_user():
     body = request.get_json(silent=True)
-    if body is None:
+    if not isinstance(body, dict):
         return jsonify({"msg": "Debe enviar información"}), 400
-    if 'username' not in body:
-        return jsonify({"msg": "Debe enviar el nombre de usuario"}), 400
-    if 'firstname' not in body:
-        return jsonify({"msg": "Debe enviar el nombre"}), 400
-    if 'email' not in body:
-        return jsonify({"msg": "Debe enviar el correo electrónico"}), 400
-    if 'password' not in body:
-        return jsonify({"msg": "Debe enviar la contraseña"}), 400
+    error = missing_field_error(body, USER_FIELDS)
+    if error:
+        return jsonify({"msg": error}), 400
+    try:
+        birthdate = date.fromisoformat(body['birthdate'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"msg": "Debe enviar la fecha de nacimiento (AAAA-MM-DD)"}), 400
     new_user = User()
     new_user.username = body['username']
     new_user.firstname = body['firstname']
     new_user.lastname = body['lastname']
-    new_user.birthdate = body['birthdate']
+    new_user.birthdate = birthdate
     new_user.email = body['email']
     new_user.password = body['password']
     new_user.is_active = True
@@ -71,29 +148,28 @@ def create_user():
     return jsonify({"msg": "Usuario creado exitosamente"}), 201
 
 
-@app.route('/users', methods=['GET'])
+@api.route('/users', methods=['GET'])
+@conditional('user', *FAVORITE_TABLES)
 def get_users():
-    users = User.query.all()
-    users_serialized = []
-    for user in users:
-        users_serialized.append(user.serialize())
-    return jsonify({'data': users_serialized}), 200
+    if wants_stream(request):
+        return stream_rows(User, request.args, attach_favorites)
+    if wants_page(request.args):
+        return json_response(keyset_page(User, request.args, attach_favorites))
+    users_serialized = attach_favorites(serialize_result(*list_statement(User, request.args)))
+    return json_response({'data': users_serialized})
 
 
-@app.route('/users/<int:user_id>/favorites', methods=['GET'])
+@api.route('/users/<int:user_id>/favorites', methods=['GET'])
+@conditional('user', *FAVORITE_TABLES)
 def get_user_favorites(user_id):
-    user = User.query.get(user_id)
-    if not user:
+    favorites = group_favorites(db.session.execute(favorites_statement([user_id]))).get(user_id)
+    if favorites is None:
         return jsonify({"msg": "Usuario no existe"}), 404
 
-    return jsonify({
-        "people": [fav.character.serialize() for fav in user.favoritec],
-        "planets": [fav.planet.serialize() for fav in user.favoritep],
-        "vehicles": [fav.vehicle.serialize() for fav in user.favoritev]
-    }), 200
+    return json_response(favorites)
 
 
-@app.route('/users/<int:user_id>', methods=['DELETE'])
+@api.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     user = User.query.filter_by(id=user_id).first()
     if user is None:
@@ -104,256 +180,338 @@ def delete_user(user_id):
     return jsonify({"msg": "Usuario eliminado exitosamente"}), 200
 
 
+@api.route('/favorite/<kind>/batch', methods=['POST'])
+def batch_favorites(kind):
+    if kind not in FAVORITE_KINDS:
+        return jsonify({"msg": "Tipo de favorito no existe"}), 404
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not ('add' in body or 'remove' in body):
+        return jsonify({"msg": "Debe enviar las listas add y/o remove"}), 400
+    add_ids = body.get('add', [])
+    remove_ids = body.get('remove', [])
+    if not all(isinstance(ids, list) for ids in (add_ids, remove_ids)):
+        return jsonify({"msg": "add y remove deben ser listas de ids"}), 400
+    if len(add_ids) + len(remove_ids) > MAX_BATCH_IDS:
+        return jsonify({"msg": "Máximo " + str(MAX_BATCH_IDS) + " ids por solicitud"}), 413
+    # ids fuera del rango de la columna harían fallar la consulta
+    if not all(type(i) is int and MIN_INTEGER <= i <= MAX_INTEGER for i in add_ids + remove_ids):
+        return jsonify({"msg": "add y remove deben ser listas de ids"}), 400
+    if not user_exists():
+        return jsonify({"msg": "Usuario no existe"}), 404
+    return jsonify(apply_batch(kind, add_ids, remove_ids)), 200
+
+
+# BATCH
+
+# tipo en /batch -> modelo
+BATCH_TYPES = {
+    'people': Character,
+    'planets': Planet,
+    'vehicles': Vehicle,
+}
+
+
+def batch_response(body):
+    # una consulta por tipo, resultados en el orden pedido
+    unknown = [kind for kind in body if kind not in BATCH_TYPES]
+    if unknown:
+        return jsonify({"msg": "Tipos desconocidos: " + ", ".join(unknown)}), 400
+    if not body:
+        return jsonify({"msg": "Debe pedir al menos un tipo: " + ", ".join(BATCH_TYPES)}), 400
+    return json_response({kind: fetch_by_ids(BATCH_TYPES[kind], parse_ids(body[kind])) for kind in body})
+
+
+@api.route('/batch', methods=['GET'])
+@conditional('character', 'planet', 'vehicle')
+def get_batch():
+    # /batch?people=1,2&planets=3
+    return batch_response(request.args)
+
+
+@api.route('/batch', methods=['POST'])
+def post_batch():
+    # {"people": [1, 2], "planets": [3]}, para listas que no caben en la URL
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"msg": "Debe enviar un objeto con listas de ids por tipo"}), 400
+    return batch_response(body)
+
+
 # CHARACTERS
 
-@app.route('/characters', methods=['POST'])
+@api.route('/characters', methods=['POST'])
 def add_character():  # la informacion viene en el body de la request
     body = request.get_json(silent=True)
     if body is None:
         return jsonify({"msg": "Debe enviar información"}), 400
-    if 'name' not in body:
-        return jsonify({"msg": "Es obligatorio el nombre del personaje"}), 400
-    if 'height' not in body:
-        return jsonify({"msg": "Es obligatorio  la altura del personaje"}), 400
-    if 'mass' not in body:
-        return jsonify({"msg": "Es obligatorio la masa del personaje"}), 400
-    if 'hair_color' not in body:
-        return jsonify({"msg": "Es obligatorio el color de cabello del personaje"}), 400
-    if 'skin_color' not in body:
-        return jsonify({"msg": "Es obligatorio el color de piel del personaje"}), 400
-    if 'eye_color' not in body:
-        return jsonify({"msg": "Es obligatorio el color de ojos del personaje"}), 400
-    if 'birth_year' not in body:
-        return jsonify({"msg": "Es obligatorio el año de nacimiento del personaje"}), 400
-    if 'gender' not in body:
-        return jsonify({"msg": "Es obligatorio el género del personaje"}), 400
-
-    new_character = Character()
-    new_character.name = body['name']
-    new_character.height = body['height']
-    new_character.mass = body['mass']
-    new_character.hair_color = body['hair_color']
-    new_character.skin_color = body['skin_color']
-    new_character.eye_color = body['eye_color']
-    new_character.birth_year = body['birth_year']
-    new_character.gender = body['gender']
+    row, error = validate_item(Character, CHARACTER_FIELDS, body)
+    if error:
+        return jsonify({"msg": error}), 400
 
+    new_character = Character(**row)
     db.session.add(new_character)
     db.session.commit()
+    invalidate('character', new_character.id)
 
     return jsonify({"msg": "Personaje agregado exitosamente"}), 201
 
 
-@app.route('/people', methods=['GET'])
-def get_people():
-    people = Character.query.all()
-    return jsonify([pe.serialize() for pe in people]), 200
+@api.route('/characters/bulk', methods=['POST'])
+def add_characters_bulk():
+    results, status = bulk_insert(Character, CHARACTER_FIELDS, parse_bulk_body(request),
+                                  atomic=request.args.get('atomic') in ('1', 'true'))
+    return jsonify({"results": results}), status
 
 
-@app.route('/people/<int:people_id>', methods=['GET'])
+@api.route('/people', methods=['GET'])
+@conditional('character')
+def get_people():
+    if 'ids' in request.args:
+        return json_response(fetch_by_ids(Character, parse_ids(request.args['ids']),
+                                          parse_fields(Character, request.args.get('fields'))))
+    if wants_stream(request):
+        return stream_rows(Character, request.args)
+    if wants_page(request.args):
+        return json_response(keyset_page(Character, request.args))
+    return json_response(serialize_result(*list_statement(Character, request.args)))
+
+
+@api.route('/people/<int:people_id>', methods=['GET'])
+@conditional('character')
 def get_person(people_id):
-    person = Character.query.get(people_id)
-    if not person:
+    body = get_entity_json(Character, people_id, g.table_versions['character'])
+    if body is None:
         return jsonify({"msg": "Personaje no encontrado"}), 404
-    return jsonify(person.serialize()), 200
+    return Response(body, mimetype='application/json'), 200
 
 
-@app.route('/favorite/people/<int:people_id>', methods=['POST'])
+@api.route('/favorite/people/<int:people_id>', methods=['POST'])
 def add_favorite_person(people_id):
-    user = User.query.get(1)
-    person = Character.query.get(people_id)
-
-    if not person:
+    result = add_favorite('people', people_id)
+    if result == 'missing':
+        if not user_exists():
+            return jsonify({"msg": "Usuario no existe"}), 404
         return jsonify({"msg": "Personaje no existe"}), 404
-
-    fav = FavoriteCharacter(user_id=user.id, character_id=people_id)
-    db.session.add(fav)
-    db.session.commit()
+    if result == 'exists':
+        return jsonify({"msg": "Ya está en favoritos"}), 200
     return jsonify({"msg": "Personaje agregado a favoritos"}), 201
 
 
-@app.route('/favorite/people/<int:people_id>', methods=['DELETE'])
+@api.route('/favorite/people/<int:people_id>', methods=['DELETE'])
 def delete_favorite_person(people_id):
-    fav = FavoriteCharacter.query.filter_by(
-        user_id=1, character_id=people_id).first()
-    if fav is None:
+    if not remove_favorite('people', people_id):
         return jsonify({"msg": "Favorito no encontrado"}), 404
-
-    db.session.delete(fav)
-    db.session.commit()
-
     return jsonify({"msg": "Favorito eliminado"}), 200
 
 # PLANETS
 
 
-@app.route("/planets/", methods=['POST'])
+@api.route("/planets/", methods=['POST'])
 def add_planet():
     body = request.get_json(silent=True)
     if body is None:
         return jsonify({"msg": "Debe enviar información"}), 400
-    if 'name' not in body:
-        return jsonify({"msg": "Es obligatorio el nombre del planeta"}), 400
-    if 'rotation_period' not in body:
-        return jsonify({"msg": "Es obligatorio el periodo de rotación del planeta"}), 400
-    if 'orbital_period' not in body:
-        return jsonify({"msg": "Es obligatorio el periodo orbital del planeta"}), 400
-    if 'diameter' not in body:
-        return jsonify({"msg": "Es obligatorio el diámetro del planeta"}), 400
-    if 'climate' not in body:
-        return jsonify({"msg": "Es obligatorio el clima del planeta"}), 400
-    if 'gravity' not in body:
-        return jsonify({"msg": "Es obligatorio la gravedad del planeta"}), 400
-    if 'terrain' not in body:
-        return jsonify({"msg": "Es obligatorio el terreno del planeta"}), 400
-    if 'surface_water' not in body:
-        return jsonify({"msg": "Es obligatorio el agua superficial del planeta"}), 400
-    if 'population' not in body:
-        return jsonify({"msg": "Es obligatoria la población del planeta"}), 400
-
-    new_planet = Planet()
-    new_planet.name = body['name']
-    new_planet.rotation_period = body['rotation_period']
-    new_planet.orbital_period = body['orbital_period']
-    new_planet.diameter = body['diameter']
-    new_planet.climate = body['climate']
-    new_planet.gravity = body['gravity']
-    new_planet.terrain = body['terrain']
-    new_planet.surface_water = body['surface_water']
-    new_planet.population = body['population']
+    row, error = validate_item(Planet, PLANET_FIELDS, body)
+    if error:
+        return jsonify({"msg": error}), 400
 
+    new_planet = Planet(**row)
     db.session.add(new_planet)
     db.session.commit()
+    invalidate('planet', new_planet.id)
 
     return jsonify({"msg": "Planeta agregado exitosamente"}), 201
 
 
-@app.route('/planets', methods=['GET'])
-def get_planets():
-    planets = Planet.query.all()
-    return jsonify([p.serialize() for p in planets]), 200
+@api.route('/planets/bulk', methods=['POST'])
+def add_planets_bulk():
+    results, status = bulk_insert(Planet, PLANET_FIELDS, parse_bulk_body(request),
+                                  atomic=request.args.get('atomic') in ('1', 'true'))
+    return jsonify({"results": results}), status
 
 
-@app.route('/planets/<int:planet_id>', methods=['GET'])
+@api.route('/planets', methods=['GET'])
+@conditional('planet')
+def get_planets():
+    if 'ids' in request.args:
+        return json_response(fetch_by_ids(Planet, parse_ids(request.args['ids']),
+                                          parse_fields(Planet, request.args.get('fields'))))
+    if wants_stream(request):
+        return stream_rows(Planet, request.args)
+    if wants_page(request.args):
+        return json_response(keyset_page(Planet, request.args))
+    return json_response(serialize_result(*list_statement(Planet, request.args)))
+
+
+@api.route('/planets/<int:planet_id>', methods=['GET'])
+@conditional('planet')
 def get_planet(planet_id):
-    planet = Planet.query.get(planet_id)
-    if not planet:
+    body = get_entity_json(Planet, planet_id, g.table_versions['planet'])
+    if body is None:
         return jsonify({"msg": "Planeta no encontrado"}), 404
-    return jsonify(planet.serialize()), 200
+    return Response(body, mimetype='application/json'), 200
 
 
-@app.route('/favorite/planet/<int:planet_id>', methods=['POST'])
+@api.route('/favorite/planet/<int:planet_id>', methods=['POST'])
 def add_favorite_planet(planet_id):
-    user = User.query.get(1)
-    planet = Planet.query.get(planet_id)
-
-    if not planet:
+    result = add_favorite('planet', planet_id)
+    if result == 'missing':
+        if not user_exists():
+            return jsonify({"msg": "Usuario no existe"}), 404
         return jsonify({"msg": "Planeta no existe"}), 404
-
-    fav = FavoritePlanet(user_id=user.id, planet_id=planet_id)
-    db.session.add(fav)
-    db.session.commit()
-
+    if result == 'exists':
+        return jsonify({"msg": "Ya está en favoritos"}), 200
     return jsonify({"msg": "Planeta agregado a favoritos"}), 201
 
 
-@app.route('/favorite/planet/<int:planet_id>', methods=['DELETE'])
+@api.route('/favorite/planet/<int:planet_id>', methods=['DELETE'])
 def delete_favorite_planet(planet_id):
-    fav = FavoritePlanet.query.filter_by(
-        user_id=1, planet_id=planet_id).first()
-    if fav is None:
+    if not remove_favorite('planet', planet_id):
         return jsonify({"msg": "Favorito no encontrado"}), 404
-
-    db.session.delete(fav)
-    db.session.commit()
-
     return jsonify({"msg": "Vehículo eliminado de favoritos"}), 200
 
 
 # VEHICLES
-@app.route('/vehicles', methods=['POST'])
+@api.route('/vehicles', methods=['POST'])
 def add_vehicle():
     body = request.get_json(silent=True)
     if body is None:
         return jsonify({"msg": "Debe enviar información"}), 400
-    if 'name' not in body:
-        return jsonify({"msg": "Es obligatorio el nombre del vehículo"}), 400
-    if 'model' not in body:
-        return jsonify({"msg": "Es obligatorio el modelo del vehículo"}), 400
-    if 'manufacturer' not in body:
-        return jsonify({"msg": "Es obligatorio el fabricante del vehículo"}), 400
-    if 'cost_in_credits' not in body:
-        return jsonify({"msg": "Es obligatorio el costo en créditos del vehículo"}), 400
-    if 'length' not in body:
-        return jsonify({"msg": "Es obligatoria la longitud del vehículo"}), 400
-    if 'max_atmosphering_speed' not in body:
-        return jsonify({"msg": "Es obligatoria la velocidad máxima en atmósfera del vehículo"}), 400
-    if 'crew' not in body:
-        return jsonify({"msg": "Es obligatoria la tripulación del vehículo"}), 400
-    if 'passengers' not in body:
-        return jsonify({"msg": "Es obligatoria la cantidad de pasajeros del vehículo"}), 400
-    if 'cargo_capacity' not in body:
-        return jsonify({"msg": "Es obligatoria la capacidad de carga del vehículo"}), 400
-    if 'consumables' not in body:
-        return jsonify({"msg": "Es obligatorio los consumibles del vehículo"}), 400
-
-    new_vehicle = Vehicle()
-    new_vehicle.name = body['name']
-    new_vehicle.model = body['model']
-    new_vehicle.manufacturer = body['manufacturer']
-    new_vehicle.cost_in_credits = body['cost_in_credits']
-    new_vehicle.length = body['length']
-    new_vehicle.max_atmosphering_speed = body['max_atmosphering_speed']
-    new_vehicle.crew = body['crew']
-    new_vehicle.passengers = body['passengers']
-    new_vehicle.cargo_capacity = body['cargo_capacity']
-    new_vehicle.consumables = body['consumables']
+    row, error = validate_item(Vehicle, VEHICLE_FIELDS, body)
+    if error:
+        return jsonify({"msg": error}), 400
 
+    new_vehicle = Vehicle(**row)
     db.session.add(new_vehicle)
     db.session.commit()
+    invalidate('vehicle', new_vehicle.id)
 
     return jsonify({"msg": "Vehículo agregado exitosamente"}), 201
 
 
-@app.route('/vehicles/', methods=['GET'])
-def get_vehicles():
-    vehicles = Vehicle.query.all()
-    return jsonify([v.serialize() for v in vehicles]), 200
+@api.route('/vehicles/bulk', methods=['POST'])
+def add_vehicles_bulk():
+    results, status = bulk_insert(Vehicle, VEHICLE_FIELDS, parse_bulk_body(request),
+                                  atomic=request.args.get('atomic') in ('1', 'true'))
+    return jsonify({"results": results}), status
 
 
-@app.route('/vehicles/<int:vehicle_id>', methods=['GET'])
+@api.route('/vehicles/', methods=['GET'])
+@conditional('vehicle')
+def get_vehicles():
+    if 'ids' in request.args:
+        return json_response(fetch_by_ids(Vehicle, parse_ids(request.args['ids']),
+                                          parse_fields(Vehicle, request.args.get('fields'))))
+    if wants_stream(request):
+        return stream_rows(Vehicle, request.args)
+    if wants_page(request.args):
+        return json_response(keyset_page(Vehicle, request.args))
+    return json_response(serialize_result(*list_statement(Vehicle, request.args)))
+
+
+@api.route('/vehicles/<int:vehicle_id>', methods=['GET'])
+@conditional('vehicle')
 def get_vehicle(vehicle_id):
-    vehicle = Vehicle.query.get(vehicle_id)
-    if not vehicle:
+    body = get_entity_json(Vehicle, vehicle_id, g.table_versions['vehicle'])
+    if body is None:
         return jsonify({"msg": "Vehiculo no encontrado"}), 404
-    return jsonify(vehicle.serialize()), 200
+    return Response(body, mimetype='application/json'), 200
 
 
-@app.route('/favorite/vehicle/<int:vehicle_id>', methods=['POST'])
+@api.route('/favorite/vehicle/<int:vehicle_id>', methods=['POST'])
 def add_favorite_vehicle(vehicle_id):
-    user = User.query.get(1)
-    vehicle = Vehicle.query.get(vehicle_id)
-
-    if not vehicle:
+    result = add_favorite('vehicle', vehicle_id)
+    if result == 'missing':
+        if not user_exists():
+            return jsonify({"msg": "Usuario no existe"}), 404
         return jsonify({"msg": "Vehículo no existe"}), 404
-
-    fav = FavoriteVehicle(user_id=user.id, vehicle_id=vehicle_id)
-    db.session.add(fav)
-    db.session.commit()
+    if result == 'exists':
+        return jsonify({"msg": "Ya está en favoritos"}), 200
     return jsonify({"msg": "Vehículo agregado a favoritos"}), 201
 
 
-@app.route('/favorite/vehicle/<int:vehicle_id>', methods=['DELETE'])
+@api.route('/favorite/vehicle/<int:vehicle_id>', methods=['DELETE'])
 def delete_favorite_vehicle(vehicle_id):
-    fav = FavoriteVehicle.query.filter_by(
-        user_id=1, vehicle_id=vehicle_id).first()
-    if fav is None:
+    if not remove_favorite('vehicle', vehicle_id):
         return jsonify({"msg": "Favorito no encontrado"}), 404
-    db.session.delete(fav)
-    db.session.commit()
     return jsonify({"msg": "Favorito eliminado"}), 200
 
 
+def env_flag(name):
+    return os.getenv(name, '0') in ('1', 'true')
+
+
+class LazyAdmin:
+    # middleware WSGI: la app de /admin (flask_admin y sus ModelView) se construye con el primer acceso
+    def __init__(self, app):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self.admin_app = None
+        self.lock = Lock()
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '').startswith('/admin'):
+            return self.get_admin_app()(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+    def get_admin_app(self):
+        with self.lock:
+            if self.admin_app is None:
+                from admin import setup_admin
+                admin_app = Flask('admin')
+                admin_app.config.from_mapping(self.app.config)
+                db.init_app(admin_app)
+                setup_admin(admin_app)
+                self.admin_app = admin_app
+        return self.admin_app
+
+
+def create_app(api_only=None, lazy_admin=None):
+    # API_ONLY=1: solo la API, sin admin ni migraciones (workers de gunicorn).
+    # ADMIN_LAZY=1: el admin se carga con el primer acceso a /admin
+    if api_only is None:
+        api_only = env_flag('API_ONLY')
+    if lazy_admin is None:
+        lazy_admin = env_flag('ADMIN_LAZY')
+
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace(
+            "postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_BINDS'] = replica_binds()
+
+    db.init_app(app)
+    init_replicas(app, db)
+    CORS(app)
+    init_metrics(app)
+    init_compression(app)
+    init_cache(app)
+    app.register_blueprint(api)
+
+    if not api_only:
+        from flask_migrate import Migrate
+        from commands import setup_commands
+        Migrate(app, db)
+        setup_commands(app)
+        if lazy_admin:
+            app.wsgi_app = LazyAdmin(app)
+        else:
+            from admin import setup_admin
+            setup_admin(app)
+    app.extensions['sitemap'] = build_sitemap(app, admin=not api_only)
+    return app
+
+
+app = create_app()
+
+
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
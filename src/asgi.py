@@ -0,0 +1,185 @@
+"""
+Async serving path for the read endpoints (people, planets, vehicles and favorites).
+They run on SQLAlchemy's asyncio engine; every other request is handed to the
+Flask app through a WSGI adapter. Start it with SERVER_MODE=async (see gunicorn.conf.py).
+The caches are synchronous (files, Redis), so they are used from a worker thread.
+"""
+import asyncio
+import os
+import re
+from datetime import timezone
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.http import http_date, quote_etag, unquote_etag
+from werkzeug.wrappers import Request
+from app import app, FAVORITE_TABLES
+from cache import response_cache, cached_entity, cache_entity
+from compression import encode_body
+from models import Character, Planet, Vehicle, User, versions_statement, fold_versions, favorites_statement, group_favorites
+from pool import engine_options
+from replicas import ReplicaSelector, read_urls
+from serializers import dumps
+from utils import (APIException, list_statement, page_statement, page_items, wants_page, wants_stream, version_etag,
+                   is_not_modified, parse_ids, parse_fields, ids_statement, in_request_order, response_tables)
+
+ROUTES = [
+    (re.compile(r'^/people/?$'), 'list', Character, None),
+    (re.compile(r'^/people/(\d+)/?$'), 'detail', Character, "Personaje no encontrado"),
+    (re.compile(r'^/planets/?$'), 'list', Planet, None),
+    (re.compile(r'^/planets/(\d+)/?$'), 'detail', Planet, "Planeta no encontrado"),
+    (re.compile(r'^/vehicles/?$'), 'list', Vehicle, None),
+    (re.compile(r'^/vehicles/(\d+)/?$'), 'detail', Vehicle, "Vehiculo no encontrado"),
+    (re.compile(r'^/users/(\d+)/favorites/?$'), 'favorites', User, "Usuario no existe"),
+]
+
+
+def async_database_url(url):
+    if url.startswith('postgresql://'):
+        return 'postgresql+asyncpg://' + url[len('postgresql://'):]
+    if url.startswith('sqlite://'):
+        return 'sqlite+aiosqlite://' + url[len('sqlite://'):]
+    return url
+
+
+def async_engine_options(url):
+    return {key: value for key, value in engine_options(url).items() if key != 'poolclass'}
+
+
+def wsgi_environ(scope):
+    # lo mínimo para poder leer args y cabeceras con un Request de werkzeug
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = value.decode('latin-1')
+    return environ
+
+
+class AsyncReadApp:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.fallback = WsgiToAsgi(flask_app)
+        url = flask_app.config['SQLALCHEMY_DATABASE_URI']
+        # aquí solo hay lecturas: con DATABASE_READ_URLS todas van a las réplicas
+        self.engines = [create_async_engine(async_database_url(read_url), **async_engine_options(read_url))
+                        for read_url in read_urls() or [url]]
+        self.replicas = ReplicaSelector(self.engines, os.getenv("DB_READ_STRATEGY", "round_robin"))
+        self.session = async_sessionmaker(expire_on_commit=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            return await self.fallback(scope, receive, send)
+        for pattern, kind, model, not_found in ROUTES:
+            match = pattern.match(scope['path'])
+            if match:
+                break
+        else:
+            return await self.fallback(scope, receive, send)
+
+        request = Request(wsgi_environ(scope))
+        if wants_stream(request):
+            return await self.fallback(scope, receive, send)
+        try:
+            status, body, headers = await self.handle(request, kind, model, match.groups(), not_found)
+        except APIException as error:
+            status, body, headers = error.status_code, dumps(error.to_dict()), []
+
+        if status == 200:
+            etag = dict(headers).get(b'etag')
+            cache_key = (request.full_path, unquote_etag(etag.decode())[0]) if etag else None
+            encoding, body = await asyncio.to_thread(encode_body, body, request.accept_encodings, cache_key)
+            if encoding is not None:
+                headers = [(name, b'W/' + value if name == b'etag' else value) for name, value in headers]
+                headers.append((b'content-encoding', encoding.encode()))
+        headers.append((b'vary', b'Accept-Encoding'))
+        headers.append((b'access-control-allow-origin', b'*'))
+        headers.append((b'content-type', b'application/json'))
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines:
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle(self, request, kind, model, groups, not_found):
+        if kind == 'favorites':
+            tables = ('user', *FAVORITE_TABLES)
+        else:
+            tables = response_tables((model.__tablename__,), request.args)
+
+        async with self.session(bind=self.replicas.choose()) as session:
+            rows = (await session.execute(versions_statement(tables))).all()
+            versions, last_modified = fold_versions(tables, rows)
+            etag = version_etag(tables, versions)
+            if last_modified is not None:
+                last_modified = last_modified.replace(tzinfo=timezone.utc)
+            headers = [(b'etag', quote_etag(etag).encode()), (b'vary', b'Accept')]
+            if last_modified is not None:
+                headers.append((b'last-modified', http_date(last_modified).encode()))
+            if is_not_modified(request, etag, last_modified):
+                return 304, b'', headers
+
+            # misma caché de respuestas (por ruta y versión) que el decorador conditional
+            cache_key = (request.full_path, etag)
+            body = await asyncio.to_thread(response_cache.get, 'json', cache_key)
+            if body is None:
+                status, body = await self.render(session, request, kind, model, groups, not_found, versions)
+                if status != 200:
+                    return status, body, []
+                await asyncio.to_thread(response_cache.set, 'json', cache_key, body)
+            return 200, body, headers
+
+    async def render(self, session, request, kind, model, groups, not_found, versions):
+        if kind == 'list':
+            if 'ids' in request.args:
+                ids = parse_ids(request.args['ids'])
+                stmt, serializer = ids_statement(model, ids, parse_fields(model, request.args.get('fields')))
+                items = [serializer.from_row(row) for row in await session.execute(stmt)]
+                return 200, dumps(in_request_order(ids, items))
+            if wants_page(request.args):
+                stmt, serializer, limit = page_statement(model, request.args)
+            else:
+                stmt, serializer = list_statement(model, request.args)
+                limit = None
+            items = [serializer.from_row(row) for row in await session.execute(stmt)]
+            if limit is None:
+                return 200, dumps(items)
+            return 200, dumps(page_items(limit, items))
+
+        entity_id = int(groups[0])
+        if kind == 'detail':
+            version = versions[model.__tablename__]
+            body = await asyncio.to_thread(cached_entity, model.__tablename__, entity_id, version)
+            if body is None:
+                entity = await session.get(model, entity_id)
+                if entity is None:
+                    return 404, dumps({"msg": not_found})
+                body = dumps(entity.serialize())
+                await asyncio.to_thread(cache_entity, model.__tablename__, entity_id, version, body)
+            return 200, body
+
+        favorites = group_favorites(await session.execute(favorites_statement([entity_id]))).get(entity_id)
+        if favorites is None:
+            return 404, dumps({"msg": not_found})
+        return 200, dumps(favorites)
+
+
+application = AsyncReadApp(app)
@@ -0,0 +1,463 @@
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from threading import Lock
+from models import db
+from serializers import dumps
+
+logger = logging.getLogger(__name__)
+
+# Todas las cachés comparten la misma interfaz: get/set/invalidate/clear/stats con
+# (tabla o espacio de nombres, clave) y valores en bytes. CACHE_BACKEND elige dónde viven:
+# memory (por proceso), file (compartida por los workers de un mismo host) o redis (entre nodos).
+
+
+class EntityCache:
+    # backend memory: LRU acotado con TTL; guarda el JSON ya serializado (bytes) por (tabla, id)
+    backend = 'memory'
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, table, entity_id):
+        key = (table, entity_id)
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires, body = item
+            if expires < time.monotonic():
+                del self._items[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, table, entity_id, body):
+        key = (table, entity_id)
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, body)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, table, entity_id=None):
+        with self._lock:
+            if entity_id is not None:
+                self._items.pop((table, entity_id), None)
+                return
+            for key in [key for key in self._items if key[0] == table]:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class FileCache:
+    # backend file: un archivo por entrada en CACHE_DIR, visible para todos los workers del host.
+    # Las claves llevan el ETag, así que cada versión nueva deja archivos huérfanos: sweep() los
+    # borra cada max_size // 10 escrituras (vencidos primero, luego los más viejos hasta max_size)
+    backend = 'file'
+
+    def __init__(self, directory, max_size=1024, ttl=300):
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        self._sweep_every = max(1, max_size // 10)
+
+    def _table_dir(self, table):
+        return os.path.join(self.directory, hashlib.sha1(str(table).encode()).hexdigest()[:16])
+
+    def _path(self, table, key):
+        return os.path.join(self._table_dir(table), hashlib.sha1(repr(key).encode()).hexdigest())
+
+    def get(self, table, key):
+        path = self._path(table, key)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, 'rb') as cached:
+                body = cached.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return body
+
+    def set(self, table, key, body):
+        directory = self._table_dir(table)
+        os.makedirs(directory, exist_ok=True)
+        # se escribe en un temporal y se renombra: ningún worker lee un archivo a medias
+        handle, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(handle, 'wb') as tmp:
+            tmp.write(body)
+        os.replace(tmp_path, self._path(table, key))
+        self._writes += 1
+        if self._writes % self._sweep_every == 0:
+            self.sweep()
+
+    def sweep(self):
+        # varios workers pueden barrer a la vez: un archivo que ya no está se ignora
+        now = time.time()
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    modified = os.path.getmtime(path)
+                except FileNotFoundError:
+                    continue
+                if modified + self.ttl < now:
+                    self._remove(path)
+                else:
+                    entries.append((modified, path))
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.max_size)]:
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            self.evictions += 1
+        except FileNotFoundError:
+            pass
+
+    def invalidate(self, table, key=None):
+        if key is None:
+            shutil.rmtree(self._table_dir(table), ignore_errors=True)
+            return
+        try:
+            os.remove(self._path(table, key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self):
+        return {"backend": self.backend, "max_size": self.max_size, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class RedisCache:
+    # backend redis: claves "<prefijo>:<tabla>:<clave>" con expiración (SET ... EX)
+    backend = 'redis'
+
+    def __init__(self, client, prefix, ttl=300):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, table, key):
+        return f"{self.prefix}:{table}:{key!r}"
+
+    def get(self, table, key):
+        body = self.client.get(self._key(table, key))
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    def set(self, table, key, body):
+        self.client.set(self._key(table, key), body, ex=self.ttl)
+
+    def invalidate(self, table, key=None):
+        if key is not None:
+            self.client.delete(self._key(table, key))
+            return
+        keys = list(self.client.scan_iter(match=f"{self.prefix}:{table}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        return {"backend": self.backend, "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+class FakeRedis:
+    # sustituto local del cliente de Redis (REDIS_URL=fake://): mismo subconjunto de comandos
+    # que usan RedisCache e Invalidator, pero dentro del proceso. Sirve para desarrollo y pruebas.
+
+    def __init__(self):
+        self._data = {}
+        self._subscribers = []
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match='*'):
+        with self._lock:
+            keys = [key for key in self._data if fnmatch.fnmatchcase(key, match)]
+        return iter(keys)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = [pubsub for pubsub in self._subscribers if channel in pubsub.channels]
+        for pubsub in subscribers:
+            pubsub.messages.put({'type': 'message', 'channel': channel, 'data': message})
+        return len(subscribers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = FakePubSub()
+        with self._lock:
+            self._subscribers.append(pubsub)
+        return pubsub
+
+    def disconnect(self):
+        # como si se cayera el servidor: las suscripciones activas fallan con ConnectionError
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, []
+        for pubsub in subscribers:
+            pubsub.messages.put(ConnectionError("fake redis desconectado"))
+
+
+class FakePubSub:
+    def __init__(self):
+        self.channels = set()
+        self.messages = queue.Queue()
+
+    def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    def listen(self):
+        while True:
+            message = self.messages.get()
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+
+_fake_redis = None
+
+
+def redis_client(url):
+    global _fake_redis
+    if url.startswith('fake://'):
+        if _fake_redis is None:
+            _fake_redis = FakeRedis()
+        return _fake_redis
+    import redis
+    return redis.Redis.from_url(url)
+
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(tempfile.gettempdir(), "starwars-cache"))
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "starwars")
+
+
+def make_cache(name, max_size, ttl):
+    if CACHE_BACKEND == 'file':
+        return FileCache(os.path.join(CACHE_DIR, name), max_size=max_size, ttl=ttl)
+    if CACHE_BACKEND == 'redis':
+        if not REDIS_URL:
+            raise RuntimeError("CACHE_BACKEND=redis necesita REDIS_URL")
+        return RedisCache(redis_client(REDIS_URL), f"{CACHE_PREFIX}:{name}", ttl=ttl)
+    if CACHE_BACKEND != 'memory':
+        raise RuntimeError(f"CACHE_BACKEND desconocido: {CACHE_BACKEND}")
+    return EntityCache(max_size=max_size, ttl=ttl)
+
+
+entity_cache = make_cache(
+    "entity",
+    max_size=int(os.getenv("ENTITY_CACHE_SIZE", 1024)),
+    ttl=int(os.getenv("ENTITY_CACHE_TTL", 300)),
+)
+
+# respuestas completas de listas y favoritos, con la ruta y el ETag (versión de las tablas) como clave
+response_cache = make_cache(
+    "response",
+    max_size=int(os.getenv("RESPONSE_CACHE_SIZE", 256)),
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL", 3600)),
+)
+
+# cuerpos comprimidos por codificación, con la ruta y el ETag (versión de los datos) como clave
+compressed_cache = make_cache(
+    "compressed",
+    max_size=int(os.getenv("COMPRESSED_CACHE_SIZE", 256)),
+    ttl=int(os.getenv("COMPRESSED_CACHE_TTL", 3600)),
+)
+
+
+MAX_RETRY_DELAY = 30
+
+
+class Invalidator:
+    # invalidación publicada en un canal de Redis: cada worker borra la entrada de su caché
+    # local al recibir el mensaje. Sin REDIS_URL solo se invalida en el proceso actual.
+
+    def __init__(self, caches, url=None, channel=f"{CACHE_PREFIX}:invalidate"):
+        self.caches = caches
+        self.url = url
+        self.channel = channel
+        self.listening_pid = None
+        self.sleep = time.sleep  # espera entre reintentos
+        self._lock = Lock()
+        self._client = None
+
+    @property
+    def client(self):
+        # un solo cliente por proceso: su pool reutiliza las conexiones entre publicaciones
+        # (redis-py descarta las heredadas del proceso padre después del fork)
+        if self._client is None:
+            self._client = redis_client(self.url)
+        return self._client
+
+    @property
+    def origin(self):
+        # distinto en cada worker aunque el objeto se haya creado antes del fork
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def apply(self, table, key=None):
+        for cache in self.caches:
+            cache.invalidate(table, key)
+
+    def publish(self, table, key=None):
+        self.apply(table, key)
+        if self.url:
+            message = json.dumps({"origin": self.origin, "table": table, "key": key})
+            self.client.publish(self.channel, message)
+
+    def ensure_listening(self):
+        # el hilo suscriptor se arranca en cada worker (los hilos no sobreviven al fork)
+        if not self.url or self.listening_pid == os.getpid():
+            return
+        with self._lock:
+            if self.listening_pid == os.getpid():
+                return
+            self.listening_pid = os.getpid()
+            threading.Thread(target=self.listen, daemon=True).start()
+
+    def listen(self):
+        # si se pierde la conexión se reintenta con espera creciente; al volver a suscribirse se
+        # vacían las cachés locales porque pudo perderse alguna invalidación mientras tanto.
+        # Si el hilo termina, listening_pid vuelve a None y la próxima petición lo arranca de nuevo
+        delay = 1
+        reconnecting = False
+        try:
+            while True:
+                try:
+                    pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.channel)
+                    if reconnecting:
+                        for cache in self.caches:
+                            cache.clear()
+                        logger.warning("invalidación: suscripción a %s restablecida", self.channel)
+                    delay = 1
+                    for message in pubsub.listen():
+                        if message.get('type') != 'message':
+                            continue
+                        data = json.loads(message['data'])
+                        if data["origin"] != self.origin:
+                            self.apply(data["table"], data["key"])
+                    raise ConnectionError("la suscripción terminó")
+                except Exception:
+                    logger.exception("invalidación: se perdió la suscripción a %s, reintento en %ss",
+                                     self.channel, delay)
+                    reconnecting = True
+                    self.sleep(delay)
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+        finally:
+            self.listening_pid = None
+
+
+invalidation = Invalidator([entity_cache], url=os.getenv("CACHE_PUBSUB_URL", REDIS_URL))
+
+
+def invalidate(table, key=None):
+    # llamado después de cada commit que cambia un registro
+    invalidation.publish(table, key)
+
+
+def init_cache(app):
+    @app.before_request
+    def start_invalidation_listener():
+        invalidation.ensure_listening()
+
+
+def cached_entity(table, entity_id, version):
+    # cada entrada lleva la versión de la tabla con la que se leyó: una escrita antes del último
+    # cambio (en otro proceso, o leída de una réplica atrasada) no se sirve bajo el ETag nuevo
+    body = entity_cache.get(table, entity_id)
+    prefix = b'%d\n' % version
+    if body is not None and body.startswith(prefix):
+        return body[len(prefix):]
+    return None
+
+
+def cache_entity(table, entity_id, version, body):
+    entity_cache.set(table, entity_id, b'%d\n' % version + body)
+
+
+def get_entity_json(model, entity_id, version):
+    # devuelve el JSON del registro (bytes) o None si no existe; version es la que usó el ETag
+    body = cached_entity(model.__tablename__, entity_id, version)
+    if body is None:
+        entity = db.session.get(model, entity_id)
+        if entity is None:
+            return None
+        body = dumps(entity.serialize())
+        cache_entity(model.__tablename__, entity_id, version, body)
+    return body
@@ -0,0 +1,262 @@
+"""
+CLI commands registered on the Flask app, next to Flask-Migrate's `flask db`:
+
+    flask import-swapi people dumps/people.json
+    flask import-swapi vehicles dumps/vehicles.ndjson --batch-size 5000
+    flask reconcile-favorite-counts   # a mano o desde el cron opcional de render.yaml: corrige favorite_count
+"""
+import csv
+import io
+import json
+import sys
+import time
+import click
+from sqlalchemy import select, insert, update, bindparam, func
+from cache import invalidate
+from models import db, Character, Planet, Vehicle, Favorite, FAVORITE_TYPES, bump_versions
+from utils import RowNormalizer
+
+IMPORT_TYPES = {
+    'people': Character,
+    'planets': Planet,
+    'vehicles': Vehicle,
+}
+DEFAULT_BATCH_SIZE = 1000
+READ_SIZE = 1 << 16
+MAX_RECORD_SIZE = 1 << 20  # un registro de SWAPI ocupa pocos KiB
+MAX_REPORTED_ERRORS = 10
+
+
+def iter_records(source):
+    # recorre el archivo sin cargarlo entero: NDJSON (un objeto por línea), un arreglo JSON
+    # o un objeto con el arreglo en "results" (formato de las páginas de la API de SWAPI)
+    # readline acotado: un arreglo minificado puede ser una sola línea enorme
+    first_line = source.readline(READ_SIZE)
+    stripped = first_line.strip()
+    if stripped.startswith('{'):
+        try:
+            record = json.loads(stripped)
+        except ValueError:
+            record = None
+        if isinstance(record, dict) and 'results' not in record:
+            yield record
+            yield from iter_lines(source)
+            return
+    yield from iter_array(source, first_line)
+
+
+class InvalidRecord:
+    # registro que ni siquiera es JSON válido: se cuenta como rechazado y la importación sigue
+    def __init__(self, reason):
+        self.reason = reason
+
+
+def iter_lines(source, number=1):
+    # NDJSON desde la segunda línea, con líneas acotadas a MAX_RECORD_SIZE
+    while True:
+        line = source.readline(MAX_RECORD_SIZE + 1)
+        if not line:
+            return
+        number += 1
+        if len(line) > MAX_RECORD_SIZE and not line.endswith('\n'):
+            while line and not line.endswith('\n'):
+                line = source.readline(READ_SIZE)  # se descarta el resto de la línea
+            yield InvalidRecord(f"línea {number}: supera {MAX_RECORD_SIZE} caracteres")
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield InvalidRecord(f"línea {number}: JSON inválido")
+
+
+def iter_array(source, buffer):
+    # decodifica los elementos del arreglo uno a uno con raw_decode, leyendo por bloques
+    decoder = json.JSONDecoder()
+    buffer, position = _find_array_start(source, buffer)
+    while True:
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer):
+                break
+            chunk = source.read(READ_SIZE)
+            if not chunk:
+                raise click.ClickException("El archivo termina antes de cerrar el arreglo")
+            buffer, position = chunk, 0
+        if buffer[position] == ']':
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            # el elemento puede estar incompleto: se lee otro bloque, pero solo hasta MAX_RECORD_SIZE;
+            # dentro de un arreglo no hay forma de saltar un elemento roto, así que se corta ahí
+            chunk = source.read(READ_SIZE) if len(buffer) - position <= MAX_RECORD_SIZE else ''
+            if not chunk:
+                raise click.ClickException("JSON inválido cerca de: " + buffer[position:position + 80])
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield record
+        position = end
+
+
+def _find_array_start(source, buffer):
+    # devuelve (buffer, posición) justo después del "[" del arreglo de registros
+    while not buffer.strip():
+        buffer += _read_more(source)
+    if buffer.lstrip().startswith('['):
+        return buffer, buffer.index('[') + 1
+    # es un objeto: el arreglo es el valor de "results"
+    while True:
+        key = buffer.find('"results"')
+        if key != -1:
+            bracket = buffer.find('[', key)
+            if bracket != -1:
+                return buffer, bracket + 1
+            buffer = buffer[key:]
+        else:
+            # se conserva la cola por si la clave quedó partida entre dos bloques
+            buffer = buffer[-len('"results"'):]
+        buffer += _read_more(source)
+
+
+def _read_more(source):
+    chunk = source.read(READ_SIZE)
+    if not chunk:
+        raise click.ClickException("No se encontró un arreglo de registros en el archivo")
+    return chunk
+
+
+def copy_rows(connection, model, rows):
+    # COPY ... FROM STDIN en formato CSV (Postgres); None se escribe sin comillas y llega como NULL
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([row[name] for name in columns])
+    buffer.seek(0)
+    quoted = ", ".join(f'"{name}"' for name in columns)
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY "{model.__tablename__}" ({quoted}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def write_batch(model, rows):
+    # upsert por nombre: un SELECT con los nombres del lote, UPDATE (executemany) de los que
+    # existen e INSERT de los nuevos, con COPY en Postgres o executemany en los demás motores
+    by_name = {row['name']: row for row in rows}  # dentro del lote gana la última aparición
+    existing = set(db.session.scalars(select(model.name).where(model.name.in_(list(by_name)))))
+    updates = [row for name, row in by_name.items() if name in existing]
+    inserts = [row for name, row in by_name.items() if name not in existing]
+
+    connection = db.session.connection()
+    if updates:
+        values = {name: bindparam(name) for name in updates[0] if name != 'name'}
+        stmt = update(model.__table__).where(model.__table__.c.name == bindparam('match_name')).values(values)
+        connection.execute(stmt, [{**row, 'match_name': row['name']} for row in updates])
+    if inserts:
+        if connection.dialect.name == 'postgresql':
+            copy_rows(connection, model, inserts)
+        else:
+            connection.execute(insert(model.__table__), inserts)
+    bump_versions(connection, [model.__tablename__])
+    db.session.commit()
+    return len(inserts), len(updates)
+
+
+def import_records(model, records, batch_size, report):
+    normalize = RowNormalizer(model)
+    totals = {"read": 0, "inserted": 0, "updated": 0, "rejected": 0}
+    errors = []
+    batch = []
+    started = time.perf_counter()
+
+    def flush():
+        inserted, updated = write_batch(model, batch)
+        totals["inserted"] += inserted
+        totals["updated"] += updated
+        batch.clear()
+        report(totals, time.perf_counter() - started)
+
+    try:
+        for number, record in enumerate(records, start=1):
+            totals["read"] += 1
+            if isinstance(record, InvalidRecord):
+                row, error = None, record.reason
+            else:
+                row, error = normalize(record)
+            if error:
+                totals["rejected"] += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(f"registro {number}: {error}")
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+    except click.ClickException:
+        # si el archivo se corta o está roto, las filas ya validadas del último lote se guardan igual
+        if batch:
+            flush()
+        raise
+    if batch:
+        flush()
+    totals["seconds"] = round(time.perf_counter() - started, 3)
+    return totals, errors
+
+
+def reconcile_counts(entity_type, batch_size):
+    # recalcula favorite_count desde la tabla favorite por rangos de id, con un commit por lote;
+    # solo se escriben las filas que se desviaron. Devuelve cuántas se corrigieron
+    model = FAVORITE_TYPES[entity_type][0]
+    actual = (select(func.count()).where(Favorite.entity_type == entity_type, Favorite.entity_id == model.id)
+              .scalar_subquery())
+    max_id = db.session.scalar(select(func.max(model.id))) or 0
+    fixed = 0
+    for start in range(0, max_id, batch_size):
+        result = db.session.execute(
+            update(model.__table__)
+            .where(model.id > start, model.id <= start + batch_size, model.favorite_count != actual)
+            .values(favorite_count=actual))
+        if result.rowcount:
+            fixed += result.rowcount
+            # el orden de ?sort=popular y /stats cambió
+            bump_versions(db.session.connection(), [model.__tablename__])
+        db.session.commit()
+    return fixed
+
+
+def setup_commands(app):
+    @app.cli.command('import-swapi')
+    @click.argument('kind', type=click.Choice(sorted(IMPORT_TYPES)))
+    @click.argument('source', type=click.File('r', encoding='utf-8', lazy=False))
+    @click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, type=click.IntRange(1),
+                  help='Filas por lote (una transacción por lote).')
+    @click.option('--quiet', is_flag=True, help='Sin progreso por lote, solo el resumen final.')
+    def import_swapi(kind, source, batch_size, quiet):
+        """Importa un volcado de SWAPI (JSON, NDJSON o página con "results"); "-" lee de stdin."""
+        model = IMPORT_TYPES[kind]
+
+        def report(totals, elapsed):
+            if not quiet:
+                rate = totals["read"] / elapsed if elapsed else 0
+                click.echo(f"{totals['read']} leídos, {totals['inserted']} insertados, "
+                           f"{totals['updated']} actualizados, {totals['rejected']} rechazados "
+                           f"({rate:,.0f} filas/s)", err=True)
+
+        totals, errors = import_records(model, iter_records(source), batch_size, report)
+        # las filas actualizadas pueden estar en la caché de entidades de cualquier worker
+        if totals["updated"]:
+            invalidate(model.__tablename__)
+        for error in errors:
+            click.echo("rechazado: " + error, err=True)
+        click.echo(json.dumps(totals))
+        if totals["rejected"] and not (totals["inserted"] or totals["updated"]):
+            sys.exit(1)
+
+    @app.cli.command('reconcile-favorite-counts')
+    @click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, type=click.IntRange(1),
+                  help='Filas por lote (una transacción por lote).')
+    def reconcile_favorite_counts(batch_size):
+        """Corrige favorite_count de personajes, planetas y vehículos contando la tabla favorite."""
+        fixed = {entity_type: reconcile_counts(entity_type, batch_size) for entity_type in FAVORITE_TYPES}
+        click.echo(json.dumps(fixed))
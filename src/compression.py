@@ -0,0 +1,60 @@
+import gzip
+import os
+from flask import request
+from cache import compressed_cache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli es opcional
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/plain', 'application/xml')
+
+# en orden de preferencia cuando el cliente acepta ambas con el mismo q
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def encode_body(body, accept_encodings, cache_key=None):
+    # devuelve (codificación, cuerpo); (None, body) si no conviene comprimir.
+    # Con cache_key (ruta y ETag) el cuerpo comprimido se guarda: se comprime una vez por versión
+    if len(body) < COMPRESS_MIN_SIZE:
+        return None, body
+    encoding = accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return None, body
+    if cache_key is None:
+        return encoding, compress(body, encoding)
+    compressed = compressed_cache.get(encoding, cache_key)
+    if compressed is None:
+        compressed = compress(body, encoding)
+        compressed_cache.set(encoding, cache_key, compressed)
+    return encoding, compressed
+
+
+def init_compression(app):
+    @app.after_request
+    def compress_response(response):
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        etag, _ = response.get_etag()
+        cache_key = (request.full_path, etag) if etag else None
+        encoding, body = encode_body(response.get_data(), request.accept_encodings, cache_key)
+        if encoding is None:
+            return response
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            # otra representación del mismo recurso: el ETag pasa a ser débil
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,138 @@
+from sqlalchemy import select, insert, delete, literal
+from sqlalchemy.dialects import postgresql, sqlite, mysql
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Favorite, FAVORITE_TYPES, bump_versions, adjust_favorite_counts
+
+# los endpoints usan siempre el usuario 1 mientras no haya autenticación
+CURRENT_USER_ID = 1
+
+# tipo en la URL -> entity_type guardado en la tabla favorite
+FAVORITE_KINDS = {
+    'people': 'character',
+    'planet': 'planet',
+    'vehicle': 'vehicle',
+}
+
+
+def insert_existing(entity_type, entity_ids, user_id):
+    # INSERT ... SELECT desde la tabla de la entidad: los ids que no existen no generan fila,
+    # y los que ya son favoritos se saltean según lo que ofrezca la base
+    entity = FAVORITE_TYPES[entity_type][0]
+    rows = (select(literal(user_id), literal(entity_type), entity.id)
+            .where(entity.id.in_(entity_ids)))
+    columns = ['user_id', 'entity_type', 'entity_id']
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(Favorite).from_select(columns, rows).on_conflict_do_nothing(index_elements=columns)
+    if dialect == 'sqlite':
+        return sqlite.insert(Favorite).from_select(columns, rows).on_conflict_do_nothing(index_elements=columns)
+    if dialect in ('mysql', 'mariadb'):
+        return mysql.insert(Favorite).from_select(columns, rows).prefix_with('IGNORE')
+    # resto: INSERT ... SELECT ... WHERE NOT EXISTS; si otra transacción gana la carrera
+    # la restricción única lo frena con IntegrityError
+    already = select(Favorite.id).where(Favorite.user_id == user_id, Favorite.entity_type == entity_type,
+                                        Favorite.entity_id == entity.id)
+    return insert(Favorite).from_select(columns, rows.where(~already.exists()))
+
+
+def favorite_ids(entity_type, entity_ids, user_id):
+    # ids de la lista que ya son favoritos del usuario; bloquea esas filas (y el hueco del índice
+    # en InnoDB) hasta el commit para que otra request no las cambie en el medio
+    return (select(Favorite.entity_id)
+            .where(Favorite.user_id == user_id, Favorite.entity_type == entity_type,
+                   Favorite.entity_id.in_(entity_ids))
+            .with_for_update())
+
+
+def supports_returning():
+    dialect = db.session.get_bind().dialect
+    return dialect.insert_returning and dialect.delete_returning
+
+
+def add_favorite(kind, entity_id, user_id=CURRENT_USER_ID):
+    # devuelve 'added', 'exists' o 'missing'
+    entity_type = FAVORITE_KINDS[kind]
+    try:
+        result = db.session.execute(insert_existing(entity_type, [entity_id], user_id))
+    except IntegrityError:
+        # el usuario no existe (FK) o, en bases sin ON CONFLICT, otra request agregó el mismo favorito
+        db.session.rollback()
+        exists = db.session.scalars(favorite_ids(entity_type, [entity_id], user_id)).first() is not None
+        db.session.rollback()
+        return 'exists' if exists else 'missing'
+    if result.rowcount == 0:
+        entity = FAVORITE_TYPES[entity_type][0]
+        exists = db.session.get(entity, entity_id) is not None
+        db.session.rollback()
+        return 'exists' if exists else 'missing'
+    adjust_favorite_counts(db.session.connection(), entity_type, [entity_id], 1)
+    bump_versions(db.session.connection(), [Favorite.__tablename__])
+    db.session.commit()
+    return 'added'
+
+
+def remove_favorite(kind, entity_id, user_id=CURRENT_USER_ID):
+    entity_type = FAVORITE_KINDS[kind]
+    result = db.session.execute(
+        delete(Favorite).where(Favorite.user_id == user_id, Favorite.entity_type == entity_type,
+                               Favorite.entity_id == entity_id))
+    if result.rowcount == 0:
+        db.session.rollback()
+        return False
+    adjust_favorite_counts(db.session.connection(), entity_type, [entity_id], -1)
+    bump_versions(db.session.connection(), [Favorite.__tablename__])
+    db.session.commit()
+    return True
+
+
+def apply_batch(kind, add_ids, remove_ids, user_id=CURRENT_USER_ID):
+    # agrega y quita varios favoritos en una sola transacción
+    entity_type = FAVORITE_KINDS[kind]
+    entity = FAVORITE_TYPES[entity_type][0]
+    wanted = set(add_ids) | set(remove_ids)
+    existing = set(db.session.scalars(select(entity.id).where(entity.id.in_(wanted)))) if wanted else set()
+    result = {
+        "added": [],
+        "already": [],
+        "removed": [],
+        "not_favorite": [],
+        "not_found": sorted(wanted - existing),
+    }
+
+    returning = supports_returning()
+    to_add = sorted(set(add_ids) & existing)
+    if to_add:
+        if returning:
+            added = set(db.session.scalars(insert_existing(entity_type, to_add, user_id)
+                                           .returning(Favorite.entity_id)))
+        else:
+            # sin RETURNING (MySQL): se leen antes los que ya están y se insertan los demás
+            added = set(to_add) - set(db.session.scalars(favorite_ids(entity_type, to_add, user_id)))
+            if added:
+                db.session.execute(insert_existing(entity_type, sorted(added), user_id))
+        result["added"] = sorted(added)
+        result["already"] = sorted(set(to_add) - added)
+        adjust_favorite_counts(db.session.connection(), entity_type, result["added"], 1)
+
+    to_remove = sorted(set(remove_ids) & existing)
+    if to_remove:
+        stmt = delete(Favorite).where(Favorite.user_id == user_id, Favorite.entity_type == entity_type,
+                                      Favorite.entity_id.in_(to_remove))
+        if returning:
+            removed = set(db.session.scalars(stmt.returning(Favorite.entity_id)))
+        else:
+            removed = set(db.session.scalars(favorite_ids(entity_type, to_remove, user_id)))
+            if removed:
+                db.session.execute(stmt)
+        result["removed"] = sorted(removed)
+        result["not_favorite"] = sorted(set(to_remove) - removed)
+        adjust_favorite_counts(db.session.connection(), entity_type, result["removed"], -1)
+
+    if result["added"] or result["removed"]:
+        bump_versions(db.session.connection(), [Favorite.__tablename__])
+    db.session.commit()
+    return result
+
+
+def user_exists(user_id=CURRENT_USER_ID):
+    return db.session.get(User, user_id) is not None
@@ -0,0 +1,145 @@
+import os
+import time
+from bisect import bisect_left
+from threading import Lock
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.total}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class RequestMetrics:
+    # histogramas por (ruta, método, estado): latencia, número de sentencias SQL y tiempo en SQL
+
+    def __init__(self):
+        self._lock = Lock()
+        self.latency = {}
+        self.statements = {}
+        self.sql_seconds = {}
+
+    def observe(self, key, seconds, statements, sql_seconds):
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.statements[key] = Histogram(STATEMENT_BUCKETS)
+                self.sql_seconds[key] = 0.0
+            self.latency[key].observe(seconds)
+            self.statements[key].observe(statements)
+            self.sql_seconds[key] += sql_seconds
+
+    def render(self):
+        lines = []
+        with self._lock:
+            keys = sorted(self.latency)
+            lines.append('# HELP http_request_duration_seconds Request latency by route and status.')
+            lines.append('# TYPE http_request_duration_seconds histogram')
+            for key in keys:
+                lines.extend(self.latency[key].lines('http_request_duration_seconds', _labels(key)))
+            lines.append('# HELP http_request_sql_statements SQL statements executed per request.')
+            lines.append('# TYPE http_request_sql_statements histogram')
+            for key in keys:
+                lines.extend(self.statements[key].lines('http_request_sql_statements', _labels(key)))
+            lines.append('# HELP http_request_sql_seconds_total Time spent in SQL by route and status.')
+            lines.append('# TYPE http_request_sql_seconds_total counter')
+            for key in keys:
+                lines.append(f'http_request_sql_seconds_total{{{_labels(key)}}} {self.sql_seconds[key]}')
+        return lines
+
+
+def _labels(key):
+    route, method, status = key
+    return f'route="{route}",method="{method}",status="{status}"'
+
+
+def gauge_lines(prefix, values, help_text):
+    # convierte un dict plano de números en gauges de Prometheus
+    lines = []
+    for name, value in sorted(values.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f'# HELP {prefix}_{name} {help_text}')
+        lines.append(f'# TYPE {prefix}_{name} gauge')
+        lines.append(f'{prefix}_{name} {value}')
+    return lines
+
+
+def labeled_gauge_lines(prefix, series, help_text):
+    # como gauge_lines para varios dicts [(etiquetas, valores)]: una cabecera por métrica
+    # y una línea por serie, p. ej. db_pool_checkouts{bind="replica_0"} 12
+    lines = []
+    names = sorted({name for _, values in series for name, value in values.items()
+                    if not isinstance(value, bool) and isinstance(value, (int, float))})
+    for name in names:
+        lines.append(f'# HELP {prefix}_{name} {help_text}')
+        lines.append(f'# TYPE {prefix}_{name} gauge')
+        for labels, values in series:
+            value = values.get(name)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f'{prefix}_{name}{{{label_text}}} {value}')
+    return lines
+
+
+request_metrics = RequestMetrics()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context() and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+
+
+def init_metrics(app):
+    server_timing = os.getenv('SERVER_TIMING', '0') in ('1', 'true')
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        if 'request_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_metrics.observe((route, request.method, response.status_code),
+                                elapsed, g.sql_count, g.sql_seconds)
+        if server_timing:
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.2f}, '
+                f'db;dur={g.sql_seconds * 1000:.2f};desc="{g.sql_count} queries"')
+        return response
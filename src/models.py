@@ -1,9 +1,43 @@
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Boolean, Integer, ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from datetime import date
+from sqlalchemy import String, Boolean, Integer, Float, DateTime, ForeignKey, event, select, update, insert, delete, and_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapped, mapped_column, relationship, Session, attributes
+from datetime import date, datetime, timezone
+from typing import Optional
+from serializers import serializer_for
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+UNKNOWN_VALUES = ('', 'unknown', 'n/a', 'none', 'indefinite')
+
+
+def to_number(value):
+    # "1,000,000" -> 1000000.0; "unknown", "n/a" o cualquier texto no numérico -> None
+    if value is None:
+        return None
+    value = str(value).strip().lower().replace(',', '')
+    if value in UNKNOWN_VALUES:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def with_numeric_values(model, row):
+    # completa las columnas numéricas a partir de los textos originales de SWAPI
+    for field, typed in getattr(model, 'numeric_fields', {}).items():
+        if field in row:
+            row[typed] = to_number(row[field])
+    return row
+
+
+def trigram_index(table, column):
+    # GIN trigram en Postgres (sirve para ILIKE 'x%' y '%x%'); índice normal en otros motores
+    return db.Index(f'ix_{table}_{column}_trgm', column, postgresql_using='gin',
+                    postgresql_ops={column: 'gin_trgm_ops'})
 
 
 class User(db.Model):
@@ -16,31 +50,38 @@ class User(db.Model):
     email: Mapped[str] = mapped_column( String(120), unique=True, nullable=False)
     password: Mapped[str] = mapped_column(nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean(), nullable=False)
-    favoritec: Mapped[list['FavoriteCharacter']] = relationship(back_populates='user')
-    favoritep: Mapped[list['FavoritePlanet'] ] = relationship(back_populates='user')
-    favoritev: Mapped[list['FavoriteVehicle'] ] = relationship(back_populates='user')
+    favorites: Mapped[list['Favorite']] = relationship(back_populates='user', cascade='all, delete-orphan')
+
+    # columnas expuestas por la API (atributo -> clave en el JSON)
+    api_fields = {
+        "id": "id",
+        "username": "username",
+        "firstname": "firstname",
+        "lastname": "lastname",
+        "birthdate": "birthdate",
+        "email": "email",
+        "is_active": "is_active",
+    }
 
 
     def __repr__(self):
         return f' {self.username} - {self.firstname} {self.lastname} ' 
-    def serialize(self):     
-        return {
-            "id": self.id,
-            "username": self.username,
-            "firstname": self.firstname,
-            "lastname": self.lastname,
-            "birthdate": self.birthdate.strftime("%Y-%m-%d"),
-            "email": self.email,
-            "is_active": self.is_active,
-            "favorite_characters": [fav.character.serialize() for fav in self.favoritec],
-            "favorite_planets": [fav.planet.serialize() for fav in self.favoritep],
-            "favorite_vehicles": [fav.vehicle.serialize() for fav in self.favoritev]
-
-        }    
+    def serialize(self):
+        data = serializer_for(User).from_object(self)
+        attach_favorites([data])
+        return data
 
 
 class Character(db.Model):
     __tablename__ = 'character'
+    __table_args__ = (
+        trigram_index('character', 'name'),
+        db.Index('ix_character_name', 'name'),  # igualdad exacta (upsert por nombre en import-swapi)
+        db.Index('ix_character_popular', 'favorite_count', 'id'),  # ?sort=popular y /stats
+        db.Index('ix_character_gender', 'gender'),
+        db.Index('ix_character_height', 'height'),
+        db.Index('ix_character_mass', 'mass'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     birth_year: Mapped[str] = mapped_column(String(20), nullable=False)
@@ -50,26 +91,35 @@ class Character(db.Model):
     skin_color: Mapped[str] = mapped_column(String(20), nullable=False)
     height: Mapped[int] = mapped_column(Integer, nullable=False)
     mass: Mapped[int] = mapped_column(Integer, nullable=False)
-    favorites_by: Mapped[list['FavoriteCharacter'] ] = relationship(back_populates='character')
+    # favoritos de la entidad, mantenido por favorites.py (flask reconcile-favorite-counts lo corrige)
+    favorite_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+
+    api_fields = {
+        "id": "id",
+        "name": "name",
+        "birth_year": "birth year",
+        "eye_color": "eye color",
+        "gender": "gender",
+        "hair_color": "hair color",
+        "skin_color": "skincolor",
+        "height": "height",
+        "mass": "mass",
+    }
 
     def __repr__(self):
         return f' {self.name} '
-    def serialize(self): 
-        return {
-            "id": self.id,
-            "name": self.name,
-            "birth year": self.birth_year,
-            "eye color": self.eye_color,    
-            "gender": self.gender,
-            "hair color": self.hair_color,
-            "skincolor": self.skin_color,
-            "height": self.height,
-            "mass": self.mass,
-     
-        }   
+    def serialize(self):
+        return serializer_for(Character).from_object(self)
 
 class Planet(db.Model):
     __tablename__ = 'planet'
+    __table_args__ = (
+        trigram_index('planet', 'name'),
+        db.Index('ix_planet_name', 'name'),
+        db.Index('ix_planet_popular', 'favorite_count', 'id'),
+        trigram_index('planet', 'climate'),
+        trigram_index('planet', 'terrain'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     climate: Mapped[str] = mapped_column(String(50), nullable=False)
@@ -80,27 +130,49 @@ class Planet(db.Model):
     rotation_period: Mapped[str] = mapped_column(String(20), nullable=False)
     population: Mapped[str] = mapped_column(String(30), nullable=False)
     surface_water: Mapped[str] = mapped_column(String(20), nullable=False)
-    favorites_by: Mapped[list['FavoritePlanet']] = relationship(back_populates='planet')
+    # copias numéricas de las columnas de texto, para ordenar, filtrar por rango y agregar en SQL
+    diameter_value: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    orbital_period_value: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    rotation_period_value: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    population_value: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    surface_water_value: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    favorite_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+
+    api_fields = {
+        "id": "id",
+        "name": "name",
+        "climate": "climate",
+        "terrain": "terrain",
+        "gravity": "gravity",
+        "diameter": "diameter",
+        "orbital_period": "orbital_period",
+        "rotation_period": "rotation_period",
+        "population": "population",
+        "surface_water": "surface_water",
+    }
+
+    numeric_fields = {
+        "diameter": "diameter_value",
+        "orbital_period": "orbital_period_value",
+        "rotation_period": "rotation_period_value",
+        "population": "population_value",
+        "surface_water": "surface_water_value",
+    }
     
     def __repr__(self):
         return f' {self.name} '
-    def serialize(self): 
-        return {
-            "id": self.id,
-            "name": self.name,
-            "climate": self.climate,
-            "terrain": self.terrain,
-            "gravity": self.gravity,
-            "diameter": self.diameter,
-            "orbital_period": self.orbital_period,
-            "rotation_period": self.rotation_period,
-            "population": self.population,
-            "surface_water": self.surface_water,
-
-        }   
+    def serialize(self):
+        return serializer_for(Planet).from_object(self)
 
 class Vehicle(db.Model):
     __tablename__ = 'vehicle'
+    __table_args__ = (
+        trigram_index('vehicle', 'name'),
+        db.Index('ix_vehicle_name', 'name'),
+        db.Index('ix_vehicle_popular', 'favorite_count', 'id'),
+        trigram_index('vehicle', 'manufacturer'),
+        db.Index('ix_vehicle_vehicle_class', 'vehicle_class'),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     model: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -113,56 +185,217 @@ class Vehicle(db.Model):
     max_atmosphering_speed: Mapped[str] = mapped_column( String(20), nullable=False)
     cargo_capacity: Mapped[str] = mapped_column(String(20), nullable=False)
     consumables: Mapped[str] = mapped_column(String(50), nullable=False)
-    favorites_by: Mapped[list['FavoriteVehicle']] = relationship(back_populates='vehicle')
+    cost_in_credits_value: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    length_value: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    crew_value: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    passengers_value: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    cargo_capacity_value: Mapped[Optional[float]] = mapped_column(Float, index=True)
+    favorite_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+
+    api_fields = {
+        "id": "id",
+        "name": "name",
+        "model": "model",
+        "vehicle_class": "vehicle_class",
+        "manufacturer": "manufacturer",
+        "cost_in_credits": "cost_in_credits",
+        "length": "length",
+        "crew": "crew",
+        "passengers": "passengers",
+        "max_atmosphering_speed": "max_atmosphering_speed",
+        "cargo_capacity": "cargo_capacity",
+        "consumables": "consumables",
+    }
+
+    numeric_fields = {
+        "cost_in_credits": "cost_in_credits_value",
+        "length": "length_value",
+        "crew": "crew_value",
+        "passengers": "passengers_value",
+        "cargo_capacity": "cargo_capacity_value",
+    }
   
     def __repr__(self):
         return f' {self.name} '
-    def serialize(self): 
-        return {
-            "id": self.id,
-            "name": self.name,
-            "model": self.model,
-            "vehicle_class": self.vehicle_class,
-            "manufacturer": self.manufacturer,
-            "cost_in_credits": self.cost_in_credits,
-            "length": self.length,
-            "crew": self.crew,
-            "passengers": self.passengers,
-            "max_atmosphering_speed": self.max_atmosphering_speed,
-            "cargo_capacity": self.cargo_capacity,
-            "consumables": self.consumables,
-       
-        }
+    def serialize(self):
+        return serializer_for(Vehicle).from_object(self)
          
-class FavoriteCharacter(db.Model):
-        __tablename__ = 'favoritecharacter'
+class Favorite(db.Model):
+        # favoritos de todos los tipos en una sola tabla: (usuario, tipo de entidad, id de la entidad)
+        __tablename__ = 'favorite'
+        __table_args__ = (
+            db.Index('ix_favorite_user_entity', 'user_id', 'entity_type', 'entity_id', unique=True),
+            db.Index('ix_favorite_entity', 'entity_type', 'entity_id'),
+        )
         id: Mapped[int] = mapped_column(primary_key=True)
         user_id: Mapped[int] = mapped_column(ForeignKey('user.id'), nullable=False)
-        character_id: Mapped[int] = mapped_column(ForeignKey('character.id'), nullable=False)
-        user: Mapped['User'] = relationship(back_populates='favoritec')
-        character: Mapped['Character'] = relationship( back_populates='favorites_by')
+        entity_type: Mapped[str] = mapped_column(String(20), nullable=False)
+        entity_id: Mapped[int] = mapped_column(Integer, nullable=False)
+        user: Mapped['User'] = relationship(back_populates='favorites')
 
         def __repr__(self):
-            return f'{self.character.name}'
-        
+            return f' {self.entity_type} {self.entity_id} '
 
-class FavoritePlanet(db.Model):
-        __tablename__ = 'favoriteplanet'
-        id: Mapped[int] = mapped_column(primary_key=True)
-        user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
-        planet_id: Mapped[int] = mapped_column(ForeignKey('planet.id'))
-        user: Mapped['User'] = relationship(back_populates='favoritep')
-        planet: Mapped['Planet'] = relationship(back_populates='favorites_by')
-        def __repr__(self):
-            return f' {self.planet.name} '
 
-class FavoriteVehicle(db.Model):
-        __tablename__ = 'favoritevehicle'
-        id: Mapped[int] = mapped_column(primary_key=True)
-        user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
-        vehicle_id: Mapped[int] = mapped_column(ForeignKey('vehicle.id'))
-        user: Mapped['User'] = relationship(back_populates='favoritev')
-        vehicle: Mapped['Vehicle'] = relationship(back_populates='favorites_by')
-        def __repr__(self):
-            return f' {self.vehicle.name} ' 
+# entity_type -> (modelo, clave en /users/<id>/favorites, clave en User.serialize)
+# para agregar un tipo nuevo de favorito basta con registrarlo aquí
+FAVORITE_TYPES = {
+    'character': (Character, 'people', 'favorite_characters'),
+    'planet': (Planet, 'planets', 'favorite_planets'),
+    'vehicle': (Vehicle, 'vehicles', 'favorite_vehicles'),
+}
+
+
+def favorites_statement(user_ids):
+    # una sola consulta: usuario -> favoritos -> LEFT JOIN a cada tabla de entidades;
+    # los usuarios sin favoritos salen con una fila de nulos
+    columns = [User.id, Favorite.entity_type]
+    for model, _, _ in FAVORITE_TYPES.values():
+        columns.extend(serializer_for(model).columns)
+    stmt = select(*columns).select_from(User).outerjoin(Favorite, Favorite.user_id == User.id)
+    for entity_type, (model, _, _) in FAVORITE_TYPES.items():
+        stmt = stmt.outerjoin(model, and_(Favorite.entity_type == entity_type, model.id == Favorite.entity_id))
+    return stmt.where(User.id.in_(user_ids)).order_by(User.id, Favorite.id)
+
+
+def group_favorites(rows, key_index=1):
+    # {user_id: {"people": [...], "planets": [...], "vehicles": [...]}}
+    # key_index=1 usa las claves del endpoint de favoritos, 2 las de User.serialize
+    grouped = {}
+    for row in rows:
+        favorites = grouped.get(row[0])
+        if favorites is None:
+            favorites = grouped[row[0]] = {spec[key_index]: [] for spec in FAVORITE_TYPES.values()}
+        start = 2
+        for entity_type, spec in FAVORITE_TYPES.items():
+            serializer = serializer_for(spec[0])
+            end = start + len(serializer.columns)
+            if row[1] == entity_type and row[start] is not None:
+                favorites[spec[key_index]].append(serializer.from_row(row[start:end]))
+            start = end
+    return grouped
+
+
+def attach_favorites(users):
+    # agrega los favoritos a usuarios ya serializados con una consulta para todo el lote
+    if not users:
+        return users
+    grouped = group_favorites(db.session.execute(favorites_statement([user["id"] for user in users])), 2)
+    for user in users:
+        user.update(grouped.get(user["id"], {}))
+    return users
+
+
+@event.listens_for(Character, 'after_delete')
+@event.listens_for(Planet, 'after_delete')
+@event.listens_for(Vehicle, 'after_delete')
+def _delete_entity_favorites(mapper, connection, target):
+    # entity_id no tiene clave foránea, así que los favoritos se borran a mano
+    connection.execute(delete(Favorite).where(
+        Favorite.entity_type == target.__tablename__, Favorite.entity_id == target.id))
+
+
+def adjust_favorite_counts(connection, entity_type, entity_ids, delta):
+    # favorite_count = favorite_count ± 1 en la misma transacción que el alta o la baja del favorito
+    spec = FAVORITE_TYPES.get(entity_type)
+    if spec is None:
+        return
+    model = spec[0]
+    if entity_ids:
+        connection.execute(update(model.__table__).where(model.id.in_(entity_ids))
+                           .values(favorite_count=model.favorite_count + delta))
+
+
+@event.listens_for(Favorite, 'after_insert')
+def _count_added_favorite(mapper, connection, target):
+    # solo altas y bajas con el ORM (admin, borrado en cascada de un usuario);
+    # favorites.py usa sentencias directas y ajusta el contador por su cuenta
+    adjust_favorite_counts(connection, target.entity_type, [target.entity_id], 1)
+
+
+@event.listens_for(Favorite, 'after_delete')
+def _count_removed_favorite(mapper, connection, target):
+    adjust_favorite_counts(connection, target.entity_type, [target.entity_id], -1)
+
+
+@event.listens_for(Favorite, 'after_update')
+def _count_moved_favorite(mapper, connection, target):
+    # editar entity_type o entity_id en el admin pasa el favorito de una entidad a otra
+    old_type = attributes.get_history(target, 'entity_type').deleted
+    old_id = attributes.get_history(target, 'entity_id').deleted
+    if not (old_type or old_id):
+        return
+    adjust_favorite_counts(connection, old_type[0] if old_type else target.entity_type,
+                           [old_id[0] if old_id else target.entity_id], -1)
+    adjust_favorite_counts(connection, target.entity_type, [target.entity_id], 1)
+
+
+@event.listens_for(Planet, 'before_insert')
+@event.listens_for(Planet, 'before_update')
+@event.listens_for(Vehicle, 'before_insert')
+@event.listens_for(Vehicle, 'before_update')
+def _sync_numeric_values(mapper, connection, target):
+    for field, typed in target.numeric_fields.items():
+        setattr(target, typed, to_number(getattr(target, field)))
+
+
+class TableVersion(db.Model):
+        # contador por tabla que sube en cada commit que la modifica (usado para ETag/Last-Modified)
+        __tablename__ = 'table_version'
+        table_name: Mapped[str] = mapped_column(String(50), primary_key=True)
+        version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+        updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+def bump_versions(connection, tables):
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    for table in sorted(set(tables)):
+        result = connection.execute(
+            update(TableVersion.__table__)
+            .where(TableVersion.table_name == table)
+            .values(version=TableVersion.version + 1, updated_at=now))
+        if result.rowcount == 0:
+            connection.execute(insert(TableVersion.__table__).values(
+                table_name=table, version=1, updated_at=now))
+
+
+def versions_statement(tables):
+    return (select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+            .where(TableVersion.table_name.in_(tables)))
+
+
+def get_versions(tables):
+    # devuelve ({tabla: version}, fecha de la última modificación) en una sola consulta
+    return fold_versions(tables, db.session.execute(versions_statement(tables)).all())
+
+
+def fold_versions(tables, rows):
+    versions = {table: 0 for table in tables}
+    last_modified = None
+    for table, version, updated_at in rows:
+        versions[table] = version
+        if last_modified is None or updated_at > last_modified:
+            last_modified = updated_at
+    return versions, last_modified
+
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite no valida claves foráneas salvo que se active en cada conexión
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 
+@event.listens_for(Session, 'after_flush')
+def _bump_flushed_tables(session, flush_context):
+    tables = set()
+    for obj in list(session.new) + list(session.deleted):
+        tables.add(obj.__tablename__)
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            tables.add(obj.__tablename__)
+    tables.discard(TableVersion.__tablename__)
+    if tables:
+        bump_versions(session.connection(), tables)
@@ -0,0 +1,95 @@
+import itertools
+import os
+from threading import Lock
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from pool import engine_options
+
+# DATABASE_READ_URLS=url1,url2: las lecturas de las peticiones GET van a estas réplicas.
+# DB_READ_STRATEGY elige la réplica: round_robin (por defecto) o least_connections
+REPLICA_PREFIX = 'replica_'
+READ_METHODS = ('GET', 'HEAD')
+
+
+def read_urls():
+    urls = os.getenv("DATABASE_READ_URLS", "")
+    return [url.strip().replace("postgres://", "postgresql://") for url in urls.split(",") if url.strip()]
+
+
+class ReplicaSelector:
+    def __init__(self, engines, strategy='round_robin'):
+        if strategy not in ('round_robin', 'least_connections'):
+            raise RuntimeError(f"DB_READ_STRATEGY desconocida: {strategy}")
+        self.engines = engines
+        self.strategy = strategy
+        self._cycle = itertools.cycle(range(len(engines)))
+        self._lock = Lock()
+        self.picks = [0] * len(engines)
+
+    def choose(self):
+        with self._lock:
+            if self.strategy == 'least_connections':
+                index = min(range(len(self.engines)), key=lambda i: (checked_out(self.engines[i]), self.picks[i]))
+            else:
+                index = next(self._cycle)
+            self.picks[index] += 1
+        return self.engines[index]
+
+    def status(self):
+        return {
+            "strategy": self.strategy,
+            "replicas": [{"url": engine.url.render_as_string(hide_password=True), "picks": picks,
+                          "checked_out": checked_out(engine)}
+                         for engine, picks in zip(self.engines, self.picks)],
+        }
+
+
+def checked_out(engine):
+    # conexiones en uso; los pools sin contador (NullPool, StaticPool) cuentan como 0
+    pool = engine.pool
+    return pool.checkedout() if hasattr(pool, 'checkedout') else 0
+
+
+class RoutingSession(Session):
+    # las consultas de lectura de una petición GET van a una réplica (la misma durante toda la
+    # petición); en cuanto la sesión escribe, todo lo que sigue en esa petición va al primario
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.reads_from_replica(clause):
+            replica = self.info.get('replica')
+            if replica is None:
+                replica = self.info['replica'] = current_app.extensions['replicas'].choose()
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def reads_from_replica(self, clause):
+        if self.info.get('primary'):
+            return False
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info['primary'] = True
+            return False
+        return (has_request_context() and request.method in READ_METHODS
+                and current_app.extensions.get('replicas') is not None)
+
+
+def replica_binds():
+    # cada réplica es un bind de Flask-SQLAlchemy (SQLALCHEMY_BINDS) con las mismas opciones de pool
+    return {f'{REPLICA_PREFIX}{index}': {'url': url, **engine_options(url)}
+            for index, url in enumerate(read_urls())}
+
+
+def bind_engines(db):
+    # (bind, engine) del primario y de cada réplica, para las métricas de los pools
+    return [('primary', db.engine)] + [(key, engine) for key, engine in db.engines.items()
+                                       if key is not None and key.startswith(REPLICA_PREFIX)]
+
+
+def init_replicas(app, db):
+    # después de db.init_app, cuando los engines de los binds ya existen
+    keys = [key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith(REPLICA_PREFIX)]
+    if not keys:
+        app.extensions['replicas'] = None
+        return
+    with app.app_context():
+        engines = [db.engines[key] for key in keys]
+    app.extensions['replicas'] = ReplicaSelector(engines, os.getenv("DB_READ_STRATEGY", "round_robin"))
@@ -0,0 +1,52 @@
+import json
+from datetime import date
+from functools import lru_cache
+from sqlalchemy import select
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+
+class Serializer:
+    # lista de campos compilada una vez por modelo: columnas, claves del JSON y conversiones
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.keys = tuple(model.api_fields[name] for name in fields)
+        self.columns = tuple(getattr(model, name) for name in fields)
+        self.dates = tuple(index for index, column in enumerate(self.columns)
+                           if column.type.python_type is date)
+
+    def select(self):
+        return select(*self.columns)
+
+    def from_row(self, row):
+        if self.dates:
+            row = list(row)
+            for index in self.dates:
+                if row[index] is not None:
+                    row[index] = row[index].strftime("%Y-%m-%d")
+        return dict(zip(self.keys, row))
+
+    def from_object(self, obj):
+        return self.from_row([getattr(obj, name) for name in self.fields])
+
+
+@lru_cache(maxsize=None)
+def _compile(model, fields):
+    return Serializer(model, fields)
+
+
+def serializer_for(model, fields=None):
+    return _compile(model, tuple(fields) if fields else tuple(model.api_fields))
+
+
+if orjson is not None:
+    def dumps(payload):
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+else:
+    def dumps(payload):
+        return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
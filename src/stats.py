@@ -0,0 +1,42 @@
+from sqlalchemy import select, func
+from models import db, Character, Planet, Vehicle
+from serializers import dumps
+
+STATS_TABLES = ('character', 'planet', 'vehicle', 'favorite')
+DEFAULT_TOP = 10
+MAX_TOP = 100
+
+
+def count_by(column):
+    rows = db.session.execute(
+        select(column, func.count()).group_by(column).order_by(func.count().desc(), column))
+    return [{"value": value, "count": count} for value, count in rows]
+
+
+def most_favorited(model, top):
+    # lee favorite_count con el índice (favorite_count, id): sin agregar la tabla favorite
+    rows = db.session.execute(
+        select(model.id, model.name, model.favorite_count)
+        .where(model.favorite_count > 0)
+        .order_by(model.favorite_count.desc(), model.id.desc())
+        .limit(top))
+    return [{"id": entity_id, "name": name, "favorites": favorites} for entity_id, name, favorites in rows]
+
+
+def compute_stats(top):
+    return {
+        "people_by_gender": count_by(Character.gender),
+        "planets_by_climate": count_by(Planet.climate),
+        "vehicles_by_class": count_by(Vehicle.vehicle_class),
+        "vehicles_by_manufacturer": count_by(Vehicle.manufacturer),
+        "most_favorited": {
+            "people": most_favorited(Character, top),
+            "planets": most_favorited(Planet, top),
+            "vehicles": most_favorited(Vehicle, top),
+        },
+    }
+
+
+def get_stats_json(top=DEFAULT_TOP):
+    # sin caché propia: @conditional ya guarda la respuesta por ruta (con ?top) y ETag de STATS_TABLES
+    return dumps(compute_stats(top))
@@ -1,4 +1,27 @@
-from flask import jsonify, url_for
+import hashlib
+import math
+from datetime import timezone
+from functools import lru_cache, wraps
+from flask import jsonify, url_for, current_app, request, make_response, Response, stream_with_context, g
+from sqlalchemy import insert, tuple_, Integer, Boolean
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, get_versions, bump_versions, with_numeric_values
+from serializers import serializer_for, dumps
+from cache import response_cache
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+PAGE_ARGS = ('limit', 'after', 'fields')
+SORTS = ('id', 'popular')
+STREAM_BATCH_SIZE = 500
+NDJSON_MIMETYPE = 'application/x-ndjson'
+BULK_CHUNK_SIZE = 500
+SITEMAP_MAX_AGE = 3600
+MAX_BULK_ITEMS = 10000
+MAX_BATCH_IDS = 500
+# rango de INTEGER en Postgres
+MIN_INTEGER, MAX_INTEGER = -2 ** 31, 2 ** 31 - 1
+BOOLEAN_VALUES = {'true': True, '1': True, 'false': False, '0': False}
 
 class APIException(Exception):
     status_code = 400
@@ -15,21 +38,458 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def wants_page(args):
+    return any(name in args for name in PAGE_ARGS)
+
+def parse_fields(model, raw):
+    # devuelve las columnas pedidas en ?fields=, siempre con el id para el cursor
+    if not raw:
+        return None
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in model.api_fields]
+    if unknown:
+        raise APIException("Campos desconocidos: " + ", ".join(unknown), status_code=400)
+    if 'id' not in names:
+        names.insert(0, 'id')
+    return names
+
+STRING_FILTERS = ('eq', 'prefix', 'contains')
+RANGE_FILTERS = ('gt', 'gte', 'lt', 'lte')
+NUMBER_FILTERS = ('eq',) + RANGE_FILTERS
+
+def filter_clauses(model, args):
+    # ?gender=female&height__gte=100&name__prefix=Lu&climate__contains=arid
+    clauses = []
+    for key, value in args.items():
+        name, _, op = key.partition('__')
+        if name not in model.api_fields:
+            if op:
+                raise APIException("Filtro desconocido: " + key, status_code=400)
+            continue
+        column = getattr(model, name)
+        op = op or 'eq'
+        if op in RANGE_FILTERS and name in getattr(model, 'numeric_fields', {}):
+            # rangos sobre textos de SWAPI ("1,000", "unknown") usan la columna numérica
+            column = getattr(model, model.numeric_fields[name])
+            try:
+                value = float(value)
+            except ValueError:
+                raise APIException("El filtro " + key + " debe ser un número", status_code=400)
+            if not math.isfinite(value):
+                raise APIException("El filtro " + key + " debe ser un número", status_code=400)
+        elif isinstance(column.type, Integer):
+            if op not in NUMBER_FILTERS:
+                raise APIException("Filtro no permitido: " + key, status_code=400)
+            try:
+                value = int(value)
+            except ValueError:
+                raise APIException("El filtro " + key + " debe ser un número", status_code=400)
+            # fuera del rango de la columna Postgres falla al comparar; mejor un 400
+            if not MIN_INTEGER <= value <= MAX_INTEGER:
+                raise APIException("El filtro " + key + " está fuera de rango", status_code=400)
+        elif isinstance(column.type, Boolean):
+            if op != 'eq' or value.lower() not in BOOLEAN_VALUES:
+                raise APIException("El filtro " + key + " debe ser true o false", status_code=400)
+            value = BOOLEAN_VALUES[value.lower()]
+        elif op not in STRING_FILTERS:
+            raise APIException("Filtro no permitido: " + key, status_code=400)
+
+        if op == 'eq':
+            clauses.append(column == value)
+        elif op == 'prefix':
+            clauses.append(column.istartswith(value, autoescape=True))
+        elif op == 'contains':
+            clauses.append(column.icontains(value, autoescape=True))
+        elif op == 'gt':
+            clauses.append(column > value)
+        elif op == 'gte':
+            clauses.append(column >= value)
+        elif op == 'lt':
+            clauses.append(column < value)
+        elif op == 'lte':
+            clauses.append(column <= value)
+    return clauses
+
+def parse_sort(model, args):
+    # ?sort=popular: más favoritos primero (solo personajes, planetas y vehículos)
+    sort = args.get('sort', 'id')
+    if sort not in SORTS or (sort == 'popular' and not hasattr(model, 'favorite_count')):
+        raise APIException("Orden desconocido: " + sort, status_code=400)
+    return sort
+
+class PopularSerializer:
+    # filas con favorite_count al final: sale como "favorites" y forma parte del cursor
+    def __init__(self, serializer):
+        self.serializer = serializer
+
+    def from_row(self, row):
+        item = self.serializer.from_row(row)
+        item["favorites"] = row[-1]
+        return item
+
+def list_statement(model, args, fields=None):
+    # solo se seleccionan las columnas (filas Row, sin instanciar objetos del ORM);
+    # devuelve la consulta filtrada y el serializador de esas filas
+    serializer = serializer_for(model, fields)
+    stmt = serializer.select().where(*filter_clauses(model, args))
+    if parse_sort(model, args) == 'popular':
+        # ORDER BY favorite_count DESC, id DESC recorre el índice (favorite_count, id) al revés
+        stmt = stmt.add_columns(model.favorite_count).order_by(model.favorite_count.desc(), model.id.desc())
+        return stmt, PopularSerializer(serializer)
+    return stmt.order_by(model.id), serializer
+
+def serialize_result(stmt, serializer):
+    return [serializer.from_row(row) for row in db.session.execute(stmt)]
+
+def parse_ids(raw):
+    # ?ids=3,1,2 -> [3, 1, 2], en el orden pedido
+    if isinstance(raw, str):
+        raw = [part for part in raw.split(',') if part.strip()]
+    if not isinstance(raw, list):
+        raise APIException("Los ids deben ser una lista", status_code=400)
+    try:
+        ids = [int(part) for part in raw]
+    except (TypeError, ValueError):
+        raise APIException("Los ids deben ser números", status_code=400)
+    if not all(MIN_INTEGER <= entity_id <= MAX_INTEGER for entity_id in ids):
+        raise APIException("Los ids están fuera de rango", status_code=400)
+    if not ids:
+        raise APIException("Debe enviar al menos un id", status_code=400)
+    if len(ids) > MAX_BATCH_IDS:
+        raise APIException("Máximo " + str(MAX_BATCH_IDS) + " ids por solicitud", status_code=413)
+    return ids
+
+def ids_statement(model, ids, fields=None):
+    # un solo WHERE id IN (...) para todos los ids
+    serializer = serializer_for(model, fields)
+    return serializer.select().where(model.id.in_(set(ids))), serializer
+
+def in_request_order(ids, items):
+    # mismo orden que los ids pedidos; los que no existen quedan marcados con not_found
+    found = {item["id"]: item for item in items}
+    return [found.get(entity_id, {"id": entity_id, "not_found": True}) for entity_id in ids]
+
+def fetch_by_ids(model, ids, fields=None):
+    return in_request_order(ids, serialize_result(*ids_statement(model, ids, fields)))
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+def parse_page_args(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise APIException("El parámetro limit debe ser un número", status_code=400)
+    if limit < 1:
+        raise APIException("El parámetro limit debe ser mayor que 0", status_code=400)
+    return min(limit, MAX_PAGE_SIZE), args.get('after')
+
+def parse_cursor(after, parts):
+    # "123" (por id) o "7.123" (popular: favoritos e id de la última fila)
+    try:
+        values = [int(part) for part in after.split('.')]
+    except ValueError:
+        raise APIException("Cursor inválido", status_code=400)
+    if len(values) != parts:
+        raise APIException("Cursor inválido", status_code=400)
+    return values
+
+def page_statement(model, args):
+    # paginación por cursor: WHERE id > :after ORDER BY id LIMIT :limit, o con ?sort=popular
+    # WHERE (favorite_count, id) < (:count, :id) ORDER BY favorite_count DESC, id DESC
+    limit, after = parse_page_args(args)
+    fields = parse_fields(model, args.get('fields'))
+    stmt, serializer = list_statement(model, args, fields)
+    if after is not None:
+        if isinstance(serializer, PopularSerializer):
+            stmt = stmt.where(tuple_(model.favorite_count, model.id) < tuple(parse_cursor(after, 2)))
+        else:
+            stmt = stmt.where(model.id > parse_cursor(after, 1)[0])
+    return stmt.limit(limit + 1), serializer, limit
+
+def page_items(limit, items):
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = f"{last['favorites']}.{last['id']}" if 'favorites' in last else str(last['id'])
+    return {"data": items, "next": next_cursor}
+
+def keyset_page(model, args, attach=None):
+    # attach(items) completa cada página, p. ej. con los favoritos de los usuarios
+    stmt, serializer, limit = page_statement(model, args)
+    page = page_items(limit, serialize_result(stmt, serializer))
+    if attach is not None and not args.get('fields'):
+        attach(page["data"])
+    return page
+
+def wants_stream(request):
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+def stream_rows(model, args, attach=None):
+    # NDJSON: una fila por línea, leyendo el cursor del servidor por lotes (yield_per)
+    fields = parse_fields(model, args.get('fields'))
+    stmt, serializer = list_statement(model, args, fields)
+    stmt = stmt.execution_options(yield_per=STREAM_BATCH_SIZE)
+
+    def generate():
+        for partition in db.session.execute(stmt).partitions():
+            items = [serializer.from_row(row) for row in partition]
+            if attach is not None and not fields:
+                attach(items)
+            for item in items:
+                yield dumps(item) + b"\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+def version_etag(tables, versions, stream=False):
+    etag = ".".join(str(versions[table]) for table in tables)
+    return ("ndjson-" if stream else "json-") + etag
+
+def is_not_modified(request, etag, last_modified):
+    if request.if_none_match:
+        # comparación débil: las versiones comprimidas llevan W/ delante del mismo ETag
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+def response_tables(tables, args):
+    # con ?sort=popular el orden cambia con cada favorito: la versión de favorite entra en el ETag
+    if args.get('sort') == 'popular' and 'favorite' not in tables:
+        return tuple(tables) + ('favorite',)
+    return tuple(tables)
+
+def conditional(*view_tables):
+    # ETag/Last-Modified a partir de los contadores de versión de las tablas que
+    # alimentan la respuesta; si el cliente ya la tiene se responde 304 sin ejecutar la vista
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            tables = response_tables(view_tables, request.args)
+            versions, last_modified = get_versions(tables)
+            g.table_versions = versions  # las vistas de detalle las usan en la caché de entidades
+            etag = version_etag(tables, versions, wants_stream(request))
+            if last_modified is not None:
+                last_modified = last_modified.replace(tzinfo=timezone.utc)
+
+            if is_not_modified(request, etag, last_modified):
+                response = Response(status=304)
+            else:
+                # la respuesta completa queda en caché mientras no cambie la versión de las tablas
+                cache_key = (request.full_path, etag)
+                body = response_cache.get('json', cache_key)
+                if body is not None:
+                    response = Response(body, mimetype='application/json')
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    if not response.is_streamed and response.mimetype == 'application/json':
+                        response_cache.set('json', cache_key, response.get_data())
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.vary.add('Accept')
+            return response
+        return wrapper
+    return decorator
+
+def missing_field_error(body, required):
+    # devuelve el mensaje del primer campo obligatorio que falte, o None
+    for field, message in required.items():
+        if field not in body:
+            return message
+    return None
+
+def parse_bulk_body(request):
+    # acepta un arreglo JSON o NDJSON (un objeto por línea)
+    if request.mimetype == NDJSON_MIMETYPE:
+        items = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(current_app.json.loads(line))
+            except ValueError:
+                raise APIException("JSON inválido en la línea " + str(number), status_code=400)
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            raise APIException("Debe enviar un arreglo de objetos", status_code=400)
+    if not items:
+        raise APIException("Debe enviar información", status_code=400)
+    if len(items) > MAX_BULK_ITEMS:
+        raise APIException("Máximo " + str(MAX_BULK_ITEMS) + " elementos por solicitud", status_code=413)
+    return items
+
+def _mark_skipped(results):
+    # en modo atómico, los elementos correctos tampoco se guardan si otro falla
+    for index, result in enumerate(results):
+        if result is None or result["status"] == 201:
+            results[index] = {"index": index, "status": 409,
+                              "msg": "No se guardó porque otro elemento falló"}
+    return results
+
+class RowNormalizer:
+    # convierte un registro de SWAPI (o del propio /people, /planets, /vehicles/) en una fila de la tabla;
+    # valida tipos y longitudes antes de llegar a la base (bulk_insert, flask import-swapi)
+    def __init__(self, model):
+        self.model = model
+        self.columns = [name for name in model.api_fields if name != 'id']
+        # acepta tanto los nombres de SWAPI/columnas como las claves del JSON de esta API ("birth year")
+        self.aliases = {key: name for name, key in model.api_fields.items()}
+        self.lengths = {name: getattr(model, name).type.length for name in self.columns
+                        if getattr(getattr(model, name).type, 'length', None)}
+        self.integers = [name for name in self.columns
+                         if getattr(model, name).type.python_type is int]
+
+    def __call__(self, record):
+        # devuelve (fila, None) o (None, motivo del rechazo)
+        if not isinstance(record, dict):
+            return None, "no es un objeto"
+        if isinstance(record.get('fields'), dict):
+            record = record['fields']  # fixtures de SWAPI: {"model": ..., "pk": ..., "fields": {...}}
+        row = {}
+        for key, value in record.items():
+            name = self.aliases.get(key, key)
+            if name in self.columns:
+                row[name] = value
+        missing = [name for name in self.columns if row.get(name) is None]
+        if missing:
+            return None, "faltan campos: " + ", ".join(missing)
+        for name in self.integers:
+            try:
+                value = int(float(str(row[name]).replace(',', '')))
+            except (ValueError, OverflowError):
+                return None, f"{name} no es un número: {row[name]!r}"
+            if not MIN_INTEGER <= value <= MAX_INTEGER:
+                return None, f"{name} fuera de rango: {value}"
+            row[name] = value
+        for name, length in self.lengths.items():
+            row[name] = str(row[name]).strip()
+            if len(row[name]) > length:
+                return None, f"{name} supera {length} caracteres"
+        return with_numeric_values(self.model, row), None
+
+@lru_cache(maxsize=None)
+def normalizer_for(model):
+    return RowNormalizer(model)
+
+def validate_item(model, required, item):
+    # mismas reglas para las altas de a uno y las masivas: campos obligatorios, tipos y longitudes;
+    # devuelve (fila, None) o (None, mensaje)
+    error = missing_field_error(item, required) if isinstance(item, dict) else "Debe enviar un objeto"
+    if error:
+        return None, error
+    return normalizer_for(model)({field: item[field] for field in required})
+
+def _insert_rows(stmt, chunk, results):
+    # un lote que falla en modo no atómico se reintenta fila por fila: solo se pierden las filas malas
+    try:
+        with db.session.begin_nested():
+            ids = db.session.scalars(stmt, [row for _, row in chunk]).all()
+    except SQLAlchemyError:
+        if len(chunk) == 1:
+            index = chunk[0][0]
+            current_app.logger.exception("bulk_insert: no se pudo guardar el elemento %s", index)
+            results[index] = {"index": index, "status": 500, "msg": "No se pudo guardar el elemento"}
+            return
+        for item in chunk:
+            _insert_rows(stmt, [item], results)
+        return
+    for (index, _), new_id in zip(chunk, ids):
+        results[index] = {"index": index, "status": 201, "id": new_id}
+
+def bulk_insert(model, required, items, atomic=False):
+    # valida todo en una pasada (campos, tipos y longitudes) e inserta por lotes (un executemany
+    # por lote) en una transacción; sin atomic, los elementos inválidos no deshacen el resto
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        row, error = validate_item(model, required, item)
+        if error:
+            results[index] = {"index": index, "status": 400, "msg": error}
+        else:
+            valid.append((index, row))
+
+    if atomic and len(valid) < len(items):
+        return _mark_skipped(results), 400
+
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    for start in range(0, len(valid), BULK_CHUNK_SIZE):
+        chunk = valid[start:start + BULK_CHUNK_SIZE]
+        if not atomic:
+            _insert_rows(stmt, chunk, results)
+            continue
+        try:
+            ids = db.session.scalars(stmt, [row for _, row in chunk]).all()
+        except SQLAlchemyError:
+            # el detalle del error queda en el log, no en la respuesta
+            current_app.logger.exception("bulk_insert: falló un lote de %s", model.__tablename__)
+            db.session.rollback()
+            for index, _ in chunk:
+                results[index] = {"index": index, "status": 500, "msg": "No se pudo guardar el elemento"}
+            return _mark_skipped(results), 500
+        for (index, _), new_id in zip(chunk, ids):
+            results[index] = {"index": index, "status": 201, "id": new_id}
+
+    saved = sum(1 for result in results if result["status"] == 201)
+    if saved:
+        bump_versions(db.session.connection(), [model.__tablename__])
+    db.session.commit()
+    if saved == len(results):
+        return results, 201
+    if saved == 0:
+        # nada se guardó: 400 si todo fueron errores de validación
+        return results, 400 if all(result["status"] == 400 for result in results) else 500
+    return results, 207
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
-def generate_sitemap(app):
-    links = ['/admin/']
-    for rule in app.url_map.iter_rules():
-        # Filter out rules we can't navigate to in a browser
-        # and rules that require parameters
-        if "GET" in rule.methods and has_no_empty_params(rule):
-            url = url_for(rule.endpoint, **(rule.defaults or {}))
-            if "/admin/" not in url:
-                links.append(url)
+def sitemap_links(app, admin=True):
+    links = ['/admin/'] if admin else []
+    with app.test_request_context():
+        for rule in app.url_map.iter_rules():
+            # Filter out rules we can't navigate to in a browser
+            # and rules that require parameters
+            if "GET" in rule.methods and has_no_empty_params(rule):
+                url = url_for(rule.endpoint, **(rule.defaults or {}))
+                if "/admin/" not in url:
+                    links.append(url)
+    return links
+
+def build_sitemap(app, admin=True):
+    # la tabla de rutas no cambia después del arranque: el sitemap se arma una vez
+    # (HTML y JSON) y se sirve como bytes con su ETag
+    links = sitemap_links(app, admin)
+    variants = {
+        'text/html': generate_sitemap(links).encode(),
+        'application/json': dumps({"endpoints": links}),
+    }
+    return {mimetype: (body, hashlib.sha1(body).hexdigest()) for mimetype, body in variants.items()}
+
+def sitemap_response(sitemap, request):
+    if request.args.get('format') == 'json':
+        mimetype = 'application/json'
+    else:
+        mimetype = request.accept_mimetypes.best_match(('text/html', 'application/json'), 'text/html')
+    body, etag = sitemap[mimetype]
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = SITEMAP_MAX_AGE
+    response.vary.add('Accept')
+    return response
 
+def generate_sitemap(links):
     links_html = "".join(["<li><a href='" + y + "'>" + y + "</a></li>" for y in links])
     return """
     <div style=" text-align: center; background-image: url('https://wallpapercave.com/wp/4oh3plg.jpg');background-size: cover; background-position: center;min-height: 100vh; color: white; ">
@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC)
+
+# app.py crea la app al importarse: la base por defecto de los tests es un SQLite temporal
+TMP = tempfile.mkdtemp(prefix='starwars-tests-')
+os.environ['DATABASE_URL'] = f'sqlite:///{TMP}/import.db'
+os.environ['API_ONLY'] = '1'
+os.environ.pop('DATABASE_READ_URLS', None)
+
+from sqlalchemy import event  # noqa: E402
+from app import create_app  # noqa: E402
+from cache import entity_cache, response_cache, compressed_cache  # noqa: E402
+from models import db  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # las cachés son globales del proceso: cada test empieza sin respuestas guardadas
+    for cache in (entity_cache, response_cache, compressed_cache):
+        cache.clear()
+    yield
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    # app sobre archivos SQLite nuevos; replicas=[...] configura DATABASE_READ_URLS y
+    # api_only=False registra también los comandos de la CLI
+    def factory(replicas=(), api_only=True):
+        monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path}/primary.db')
+        monkeypatch.setenv('DATABASE_READ_URLS', ','.join(f'sqlite:///{tmp_path}/{name}.db' for name in replicas))
+        app = create_app(api_only=api_only)
+        app.config['TESTING'] = True
+        with app.app_context():
+            for engine in db.engines.values():
+                db.metadata.create_all(engine)
+        return app
+    return factory
+
+
+class StatementCounter:
+    # cuenta las sentencias SQL que llegan al cursor (before_cursor_execute)
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self)
+
+
+@pytest.fixture
+def count_statements():
+    # with count_statements(app) as counter: ... -> counter.count
+    def counter(app):
+        with app.app_context():
+            return StatementCounter(db.engine)
+    return counter
@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import text
+
+from models import db, Character
+
+
+def character(index, **overrides):
+    item = {"name": f"Character {index}", "birth_year": "19BBY", "eye_color": "blue", "gender": "male",
+            "hair_color": "blond", "skin_color": "fair", "height": 172, "mass": 77}
+    item.update(overrides)
+    return item
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app().test_client()
+
+
+def stored_names(client):
+    with client.application.app_context():
+        return sorted(db.session.scalars(db.select(Character.name)))
+
+
+def test_invalid_types_are_rejected_up_front_and_good_rows_are_saved(client):
+    items = [character(0), character(1, height="tall"), character(2, name="x" * 101), character(3, mass=2 ** 40)]
+    response = client.post('/characters/bulk', json=items)
+    assert response.status_code == 207
+    results = response.json["results"]
+    assert [result["status"] for result in results] == [201, 400, 400, 400]
+    assert "height" in results[1]["msg"]
+    assert stored_names(client) == ["Character 0"]
+
+
+def test_numeric_strings_are_converted(client):
+    response = client.post('/characters/bulk', json=[character(0, height="172", mass="77.5")])
+    assert response.status_code == 201
+    person = client.get('/people/' + str(response.json["results"][0]["id"])).json
+    assert (person["height"], person["mass"]) == (172, 77)
+
+
+def test_all_invalid_is_a_400_without_atomic(client):
+    response = client.post('/characters/bulk', json=[character(0, height="tall"), {"name": "incomplete"}])
+    assert response.status_code == 400
+    assert stored_names(client) == []
+
+
+def test_atomic_saves_nothing_when_one_item_is_invalid(client):
+    response = client.post('/characters/bulk?atomic=1', json=[character(0), character(1, mass="heavy")])
+    assert response.status_code == 400
+    assert [result["status"] for result in response.json["results"]] == [409, 400]
+    assert stored_names(client) == []
+
+
+def test_a_failing_row_does_not_take_its_chunk_down(client):
+    # la base rechaza una fila que pasó la validación: se reintenta el lote fila por fila
+    with client.application.app_context():
+        db.session.execute(text("CREATE TRIGGER reject_boom BEFORE INSERT ON character "
+                                "WHEN NEW.name = 'boom' BEGIN SELECT RAISE(ABORT, 'secret driver detail'); END"))
+        db.session.commit()
+    response = client.post('/characters/bulk', json=[character(0), character(1, name="boom"), character(2)])
+    assert response.status_code == 207
+    results = response.json["results"]
+    assert [result["status"] for result in results] == [201, 500, 201]
+    assert "secret" not in response.get_data(as_text=True)
+    assert stored_names(client) == ["Character 0", "Character 2"]
+
+
+def test_single_create_applies_the_bulk_rules(client):
+    response = client.post('/characters', json=character(0, height="abc"))
+    assert response.status_code == 400
+    assert "height" in response.json["msg"]
+    assert client.post('/characters', json=character(1, height="172")).status_code == 201
+    assert stored_names(client) == ["Character 1"]
@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+import time
+
+import cache
+from cache import EntityCache, FileCache, Invalidator, redis_client
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timeout")
+        time.sleep(0.01)
+
+
+def cached_files(directory):
+    return sum(len(names) for _, _, names in os.walk(directory))
+
+
+def test_file_cache_keeps_at_most_max_size_entries(tmp_path):
+    files = FileCache(str(tmp_path), max_size=20, ttl=300)
+    # cada versión nueva del ETag es una clave nueva: sin barrido el directorio crece sin límite
+    for version in range(200):
+        files.set('json', ('/people', f'json-{version}'), b'{}')
+    assert cached_files(tmp_path) <= 20 + files._sweep_every
+    assert files.get('json', ('/people', 'json-199')) == b'{}'
+
+
+def test_file_cache_sweep_drops_expired_entries(tmp_path):
+    files = FileCache(str(tmp_path), max_size=100, ttl=60)
+    files.set('json', 'old', b'old')
+    files.set('json', 'new', b'new')
+    past = time.time() - 120
+    os.utime(files._path('json', 'old'), (past, past))
+    files.sweep()
+    assert cached_files(tmp_path) == 1
+    assert files.get('json', 'new') == b'new'
+
+
+def test_invalidation_listener_reconnects_after_a_disconnect():
+    local = EntityCache()
+    invalidator = Invalidator([local], url='fake://', channel='test:invalidate')
+    # la espera antes de reintentar termina cuando el test lo indica
+    retry = threading.Event()
+    invalidator.sleep = lambda seconds: retry.wait()
+    invalidator.ensure_listening()
+    client = redis_client('fake://')
+
+    def publish(key):
+        message = json.dumps({"origin": "other-worker", "table": "character", "key": key})
+        return client.publish('test:invalidate', message)
+
+    wait_for(lambda: publish(0) == 1)
+    local.set('character', 1, b'old')
+    publish(1)
+    wait_for(lambda: local.get('character', 1) is None)
+
+    client.disconnect()
+    local.set('character', 2, b'set while disconnected')
+    retry.set()
+    # al volver a suscribirse vacía la caché local y sigue recibiendo invalidaciones
+    wait_for(lambda: local.get('character', 2) is None)
+    local.set('character', 3, b'old')
+    wait_for(lambda: publish(3) == 1)
+    wait_for(lambda: local.get('character', 3) is None)
+    assert invalidator.listening_pid == os.getpid()
+
+
+def test_publish_reuses_one_client(monkeypatch):
+    created = []
+
+    def counting_client(url):
+        created.append(url)
+        return redis_client(url)
+
+    monkeypatch.setattr(cache, 'redis_client', counting_client)
+    invalidator = Invalidator([EntityCache()], url='fake://', channel='test:publish')
+    for key in range(3):
+        invalidator.publish('character', key)
+    assert created == ['fake://']
@@ -0,0 +1,23 @@
+from sqlalchemy import update
+
+from models import db, Character, bump_versions
+
+
+def test_detail_is_not_served_stale_after_a_write_from_another_process(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(Character(name='Luke Skywalker', birth_year='19BBY', eye_color='blue', gender='male',
+                                 hair_color='blond', skin_color='fair', height=172, mass=77))
+        db.session.commit()
+    client = app.test_client()
+    assert client.get('/people/1').json['name'] == 'Luke Skywalker'
+
+    # como el admin o import-swapi en otro proceso: cambia la fila y la versión, sin invalidar esta caché
+    with app.app_context():
+        db.session.execute(update(Character).where(Character.id == 1).values(name='Darth Vader'))
+        bump_versions(db.session.connection(), ['character'])
+        db.session.commit()
+
+    response = client.get('/people/1')
+    assert response.json['name'] == 'Darth Vader'
+    assert client.get('/people/1', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
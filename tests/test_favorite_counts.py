@@ -0,0 +1,123 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.dialects import mysql
+
+import favorites
+from models import db, User, Character, Planet, Favorite
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(api_only=False)
+    with app.app_context():
+        db.session.add_all(User(username=f'user{i}', firstname='Test', lastname='User', birthdate=date(1990, 1, 1),
+                                email=f'user{i}@example.com', password='secret', is_active=True) for i in (1, 2))
+        db.session.add_all(Character(name=f'Character {i}', birth_year='19BBY', eye_color='blue', gender='male',
+                                     hair_color='blond', skin_color='fair', height=172, mass=77) for i in (1, 2))
+        db.session.add(Planet(name='Tatooine', climate='arid', terrain='desert', gravity='1', diameter='10465',
+                              orbital_period='304', rotation_period='23', population='200000', surface_water='1'))
+        db.session.commit()
+    return app
+
+
+def counts(app, model=Character):
+    with app.app_context():
+        return dict(db.session.execute(select(model.id, model.favorite_count)).all())
+
+
+def test_api_keeps_counts_in_step(app):
+    client = app.test_client()
+    client.post('/favorite/people/1')
+    client.post('/favorite/people/1')  # repetido: no cuenta dos veces
+    client.post('/favorite/people/batch', json={"add": [2], "remove": []})
+    assert counts(app) == {1: 1, 2: 1}
+    client.delete('/favorite/people/1')
+    assert counts(app) == {1: 0, 2: 1}
+
+
+def test_editing_a_favorite_moves_its_count(app):
+    app.test_client().post('/favorite/people/1')
+    with app.app_context():
+        favorite = db.session.scalar(select(Favorite))
+        favorite.entity_id = 2
+        db.session.commit()
+    assert counts(app) == {1: 0, 2: 1}
+    with app.app_context():
+        favorite = db.session.scalar(select(Favorite))
+        favorite.entity_type = 'planet'
+        favorite.entity_id = 1
+        db.session.commit()
+    assert counts(app) == {1: 0, 2: 0}
+    assert counts(app, Planet) == {1: 1}
+
+
+def test_deleting_a_user_releases_their_favorites(app):
+    with app.app_context():
+        db.session.add_all([Favorite(user_id=1, entity_type='character', entity_id=1),
+                            Favorite(user_id=2, entity_type='character', entity_id=1)])
+        db.session.commit()
+    assert counts(app) == {1: 2, 2: 0}
+    assert app.test_client().delete('/users/2').status_code == 200
+    assert counts(app) == {1: 1, 2: 0}
+
+
+def test_reconcile_fixes_drifted_counts(app):
+    app.test_client().post('/favorite/people/2')
+    with app.app_context():
+        db.session.execute(update(Character).values(favorite_count=7))
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['reconcile-favorite-counts'])
+    assert result.exit_code == 0, result.output
+    assert counts(app) == {1: 0, 2: 1}
+
+
+def test_stats_follow_favorite_changes(app):
+    client = app.test_client()
+    assert client.get('/stats').json["most_favorited"]["people"] == []
+    client.post('/favorite/people/2')
+    assert client.get('/stats').json["most_favorited"]["people"] == [
+        {"id": 2, "name": "Character 2", "favorites": 1}]
+    assert len(client.get('/stats?top=1').json["most_favorited"]["people"]) == 1
+
+
+def test_mysql_skips_duplicates_with_insert_ignore(app, monkeypatch):
+    with app.app_context():
+        monkeypatch.setattr(db.session, 'get_bind', lambda *args, **kwargs: SimpleNamespace(dialect=mysql.dialect()))
+        sql = str(favorites.insert_existing('character', [1], 1).compile(dialect=mysql.dialect()))
+    assert sql.startswith('INSERT IGNORE INTO favorite')
+
+
+def test_batch_without_on_conflict_or_returning(app, monkeypatch):
+    # una base genérica: INSERT ... WHERE NOT EXISTS y sin RETURNING
+    client = app.test_client()
+    client.post('/favorite/people/1')
+    generic = SimpleNamespace(dialect=SimpleNamespace(name='generic', insert_returning=False, delete_returning=False))
+    monkeypatch.setattr(db.session, 'get_bind', lambda *args, **kwargs: generic)
+    response = client.post('/favorite/people/batch', json={"add": [1, 2, 3], "remove": []})
+    assert response.json["added"] == [2]
+    assert response.json["already"] == [1]
+    assert response.json["not_found"] == [3]
+    response = client.post('/favorite/people/batch', json={"add": [], "remove": [1, 2]})
+    assert response.json["removed"] == [1, 2]
+    assert client.post('/favorite/people/1').status_code == 201
+    assert client.post('/favorite/people/1').status_code == 200
+    monkeypatch.undo()
+    assert counts(app) == {1: 1, 2: 0}
+
+
+@pytest.mark.parametrize('body, status', [
+    ({"add": [2 ** 70]}, 400),
+    ({"remove": [-2 ** 40]}, 400),
+    ({"add": [True]}, 400),
+    ({"add": list(range(40000))}, 413),
+])
+def test_batch_rejects_bad_id_lists(app, body, status):
+    assert app.test_client().post('/favorite/people/batch', json=body).status_code == status
+    assert counts(app) == {1: 0, 2: 0}
+
+
+def test_id_lookups_reject_out_of_range_ids(app):
+    assert app.test_client().get('/people?ids=1,' + str(2 ** 70)).status_code == 400
@@ -0,0 +1,53 @@
+import io
+import json
+
+import click
+import pytest
+
+from commands import MAX_RECORD_SIZE, iter_records
+from models import db, Character
+
+
+def person(name):
+    return {"name": name, "height": "172", "mass": "77", "hair_color": "blond", "skin_color": "fair",
+            "eye_color": "blue", "birth_year": "19BBY", "gender": "male"}
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(api_only=False)
+
+
+def import_file(app, tmp_path, content, *args):
+    path = tmp_path / 'dump.json'
+    path.write_text(content)
+    return app.test_cli_runner().invoke(args=['import-swapi', 'people', str(path), '--quiet', *args])
+
+
+def stored_names(app):
+    with app.app_context():
+        return sorted(db.session.scalars(db.select(Character.name)))
+
+
+def test_malformed_ndjson_line_is_rejected_and_the_rest_is_imported(app, tmp_path):
+    lines = [json.dumps(person('Luke')), '{"name": "broken', json.dumps(person('Leia'))]
+    result = import_file(app, tmp_path, '\n'.join(lines) + '\n')
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.stdout.splitlines()[-1])["rejected"] == 1
+    assert 'línea 2: JSON inválido' in result.output
+    assert stored_names(app) == ['Leia', 'Luke']
+
+
+def test_broken_array_keeps_the_rows_read_before_it(app, tmp_path):
+    content = '[' + json.dumps(person('Luke')) + ', {"name": "broken"' + ', ' + json.dumps(person('Leia')) + ']'
+    result = import_file(app, tmp_path, content)
+    assert result.exit_code != 0
+    assert 'JSON inválido' in result.output
+    assert stored_names(app) == ['Luke']
+
+
+def test_broken_array_element_fails_without_reading_the_rest_of_the_file():
+    source = io.StringIO('[{"name": "broken' + ' ' * (8 * MAX_RECORD_SIZE) + '}]')
+    with pytest.raises(click.ClickException):
+        list(iter_records(source))
+    assert source.tell() < 2 * MAX_RECORD_SIZE
@@ -0,0 +1,79 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from models import db, Character, User
+from pool import TimedQueuePool, pool_status
+
+
+def character(name):
+    return {"name": name, "birth_year": "19BBY", "eye_color": "blue", "gender": "male",
+            "hair_color": "blond", "skin_color": "fair", "height": 172, "mass": 77}
+
+
+@pytest.fixture
+def app(make_app):
+    # primary.db y replica.db con la misma fila id=1 pero con nombres distintos
+    app = make_app(replicas=('replica',))
+    with app.app_context():
+        for bind, name in ((None, 'On primary'), ('replica_0', 'On replica')):
+            with db.engines[bind].begin() as connection:
+                connection.execute(insert(Character), [character(name)])
+    return app
+
+
+def names(app, bind):
+    with app.app_context(), db.engines[bind].connect() as connection:
+        return list(connection.scalars(select(Character.name).order_by(Character.id)))
+
+
+def test_get_reads_from_the_replica(app):
+    client = app.test_client()
+    assert client.get('/people/1').json['name'] == 'On replica'
+    assert [item['name'] for item in client.get('/people').json] == ['On replica']
+
+
+def test_post_writes_to_the_primary(app):
+    assert app.test_client().post('/characters', json=character('Created')).status_code == 201
+    assert names(app, None) == ['On primary', 'Created']
+    assert names(app, 'replica_0') == ['On replica']
+
+
+def test_a_flush_inside_a_get_moves_later_reads_to_the_primary(app):
+    with app.test_request_context('/people/1', method='GET'):
+        read = select(Character.name).where(Character.id == 1)
+        assert db.session.scalar(read) == 'On replica'
+        db.session.add(Character(**character('Written during a GET')))
+        db.session.flush()
+        assert db.session.scalar(read) == 'On primary'
+        db.session.rollback()
+
+
+def test_without_replicas_everything_uses_the_primary(make_app):
+    app = make_app()
+    with app.app_context():
+        db.session.add(User(username='u', firstname='a', lastname='b', birthdate=date(2000, 1, 1),
+                            email='e', password='p', is_active=True))
+        db.session.commit()
+    assert app.extensions['replicas'] is None
+    assert len(app.test_client().get('/users').json['data']) == 1
+
+
+def test_pool_stats_are_kept_per_bind(tmp_path):
+    primary = create_engine(f'sqlite:///{tmp_path}/a.db', poolclass=TimedQueuePool)
+    replica = create_engine(f'sqlite:///{tmp_path}/b.db', poolclass=TimedQueuePool)
+    for _ in range(3):
+        with primary.connect():
+            pass
+    primary.dispose()  # el pool nuevo conserva los contadores
+    assert pool_status(primary)['checkouts'] == 3
+    assert pool_status(replica, 'replica_0')['checkouts'] == 0
+
+
+def test_pool_metrics_are_labeled_by_bind(app):
+    client = app.test_client()
+    assert [pool['bind'] for pool in client.get('/metrics/pool').json['pools']] == ['primary', 'replica_0']
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'db_pool_size{bind="primary"}' in metrics
+    assert 'db_pool_size{bind="replica_0"}' in metrics
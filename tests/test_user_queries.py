@@ -0,0 +1,81 @@
+from datetime import date
+
+import pytest
+
+from models import db, User, Character, Planet, Vehicle, Favorite
+
+FAVORITES_PER_TYPE = 3
+
+
+def seed(app, users):
+    with app.app_context():
+        db.session.add_all(User(username=f'user{i}', firstname='Test', lastname=f'User {i}',
+                                birthdate=date(1990, 1, 1), email=f'user{i}@example.com',
+                                password='secret', is_active=True) for i in range(users))
+        for i in range(FAVORITES_PER_TYPE):
+            db.session.add(Character(name=f'Character {i}', birth_year='19BBY', eye_color='blue', gender='male',
+                                     hair_color='blond', skin_color='fair', height=172, mass=77))
+            db.session.add(Planet(name=f'Planet {i}', climate='arid', terrain='desert', gravity='1',
+                                  diameter='10465', orbital_period='304', rotation_period='23',
+                                  population='200000', surface_water='1'))
+            db.session.add(Vehicle(name=f'Vehicle {i}', model='T-16', vehicle_class='repulsorcraft',
+                                   manufacturer='Incom', cost_in_credits='14500', length='10.4', crew='1',
+                                   passengers='0', max_atmosphering_speed='1200', cargo_capacity='50',
+                                   consumables='0'))
+        db.session.flush()
+        db.session.add_all(Favorite(user_id=user_id, entity_type=entity_type, entity_id=entity_id)
+                           for user_id in range(1, users + 1)
+                           for entity_type in ('character', 'planet', 'vehicle')
+                           for entity_id in range(1, FAVORITES_PER_TYPE + 1))
+        db.session.commit()
+
+
+# versiones de las tablas (ETag) + usuarios + favoritos de todos los usuarios de la respuesta
+@pytest.mark.parametrize('path, expected', [
+    ('/users', 3),
+    ('/users?limit=20', 3),
+    ('/users?stream=1', 3),
+    ('/users/1/favorites', 2),
+])
+@pytest.mark.parametrize('users', [2, 20])
+def test_user_routes_run_a_constant_number_of_queries(make_app, count_statements, path, expected, users):
+    app = make_app()
+    seed(app, users)
+    with count_statements(app) as counter:
+        response = app.test_client().get(path)
+        body = response.get_data()  # el stream se consume antes de dejar de contar
+    assert response.status_code == 200
+    assert counter.count == expected
+    assert body.count(b'Character 0') == (1 if 'favorites' in path else min(users, 20))
+
+
+@pytest.mark.parametrize('query, ids', [
+    ('is_active=true', [1, 2]),
+    ('is_active=0', []),
+])
+def test_boolean_filters_are_parsed(make_app, query, ids):
+    app = make_app()
+    seed(app, 2)
+    response = app.test_client().get('/users?' + query)
+    assert response.status_code == 200
+    assert [user['id'] for user in response.json['data']] == ids
+
+
+@pytest.mark.parametrize('path', [
+    '/users?is_active=yes',
+    '/people?height__gte=99999999999999999999',
+    '/planets?diameter__gte=inf',
+])
+def test_out_of_range_filters_are_a_400(make_app, path):
+    response = make_app().test_client().get(path)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('missing', ['username', 'firstname', 'lastname', 'email', 'password', 'birthdate'])
+def test_create_user_requires_every_field(make_app, missing):
+    body = {"username": "luke", "firstname": "Luke", "lastname": "Skywalker", "birthdate": "1990-01-01",
+            "email": "luke@example.com", "password": "secret"}
+    del body[missing]
+    response = make_app().test_client().post('/users', json=body)
+    assert response.status_code == 400
+    assert response.json["msg"].startswith("Debe enviar")